@@ -0,0 +1,160 @@
+"""属性编解码的微基准测试，对比逐字段 if/elif 分发加 pendulum 的旧实现和按类型表预编译的 codec。
+
+    python -m benchmarks.bench_codec --size 10000 --repeat 5
+
+编码是为每部电影生成 pages.create 的 properties，解码是把 databases.query 返回的页面还原为镜像记录。
+"""
+import argparse
+import time
+
+import pendulum
+
+from benchmarks.fake_services import make_interests, to_response_property
+from douban2notion import utils
+from douban2notion.config import (
+    DATE,
+    FILES,
+    MULTI_SELECT,
+    NUMBER,
+    RELATION,
+    RICH_TEXT,
+    SELECT,
+    STATUS,
+    TITLE,
+    URL,
+    movie_properties_type_dict,
+)
+from douban2notion.douban import parse_interest
+from douban2notion.movie_mirror import decode_movie_page
+from douban2notion.records import intern_ids
+
+DECODED_FIELDS = ["豆瓣链接", "短评", "状态", "日期", "评分", "分类"]
+
+
+def legacy_get_properties(data, type_map):
+    properties = {}
+    for key, value in data.items():
+        if value is None:
+            continue
+        prop_type = type_map.get(key)
+        if prop_type == TITLE:
+            properties[key] = utils.get_title(value)
+        elif prop_type == RICH_TEXT:
+            properties[key] = utils.get_rich_text(value)
+        elif prop_type == NUMBER:
+            properties[key] = utils.get_number(value)
+        elif prop_type == STATUS:
+            properties[key] = {"status": {"name": value}}
+        elif prop_type == FILES:
+            properties[key] = utils.get_file(value)
+        elif prop_type == DATE:
+            properties[key] = utils.get_date(pendulum.from_timestamp(value, tz=utils.tz).to_datetime_string())
+        elif prop_type == URL:
+            properties[key] = utils.get_url(value)
+        elif prop_type == SELECT:
+            properties[key] = utils.get_select(value)
+        elif prop_type == MULTI_SELECT:
+            properties[key] = utils.get_multi_select(value)
+        elif prop_type == RELATION:
+            properties[key] = utils.get_relation(value)
+    return properties
+
+
+def legacy_get_property_value(prop):
+    if prop is None:
+        return None
+    prop_type = prop.get("type")
+    content = prop.get(prop_type)
+    if not content:
+        return None
+    if prop_type in ["title", "rich_text"]:
+        return content[0].get("plain_text") if content else None
+    if prop_type in ["status", "select"]:
+        return content.get("name")
+    if prop_type == "files" and content:
+        return content[0].get("external", {}).get("url")
+    if prop_type == "date":
+        return int(pendulum.parse(content.get("start")).timestamp()) if content.get("start") else 0
+    return content
+
+
+def legacy_decode_movie_page(page):
+    properties = page.get("properties")
+    return legacy_get_property_value(properties.get("豆瓣链接")), {
+        field: legacy_get_property_value(properties.get(field)) for field in DECODED_FIELDS[1:]
+    }
+
+
+def make_movies(size):
+    movies = []
+    for interest in make_interests(size):
+        movie = parse_interest(interest)
+        movie_data = movie.to_movie_data()
+        movie_data["分类"] = [f"{index:032x}" for index in range(2)]
+        movie_data["封面"] = movie.cover
+        movie_data["演员"] = list(movie.actors)
+        movies.append(movie_data)
+    return movies
+
+
+def make_pages(movies):
+    return [
+        {
+            "id": str(index),
+            "properties": {
+                key: to_response_property(value)
+                for key, value in legacy_get_properties(movie_data, movie_properties_type_dict).items()
+            },
+        }
+        for index, movie_data in enumerate(movies)
+    ]
+
+
+def measure(fn, items, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(items) * 1e6
+
+
+def check_equivalent(movies, pages):
+    for movie_data, page in zip(movies, pages):
+        assert utils.get_properties(movie_data, movie_properties_type_dict) == legacy_get_properties(
+            movie_data, movie_properties_type_dict
+        )
+        url, movie = decode_movie_page(page)
+        legacy_url, legacy_fields = legacy_decode_movie_page(page)
+        assert url == legacy_url
+        legacy_fields["分类"] = intern_ids(legacy_fields["分类"])
+        assert all(movie.get(field) == legacy_fields[field] for field in legacy_fields)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    movies = make_movies(options.size)
+    pages = make_pages(movies)
+    check_equivalent(movies, pages)
+
+    codec = utils.get_codec(movie_properties_type_dict)
+    rows = [
+        ("encode", measure(lambda movie: legacy_get_properties(movie, movie_properties_type_dict), movies, options.repeat),
+         measure(codec.encode, movies, options.repeat)),
+        ("decode", measure(legacy_decode_movie_page, pages, options.repeat),
+         measure(decode_movie_page, pages, options.repeat)),
+    ]
+    print(f"{options.size} pages, best of {options.repeat}")
+    print(f"{'':<8} {'legacy(us)':>11} {'codec(us)':>10} {'speedup':>8}")
+    for name, legacy, compiled in rows:
+        print(f"{name:<8} {legacy:>11.2f} {compiled:>10.2f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""命令行入口的导入耗时基准，使用 `python -X importtime` 测量，超出预算时以非零状态退出。
+
+    python -m benchmarks.bench_import --repeat 5
+    python -m benchmarks.bench_import --scale 2   # 在较慢的机器上放宽预算
+
+每个入口在新进程中导入 --repeat 次取中位数；除了耗时预算，还检查入口没有导入不该加载的重量级依赖。
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# 入口 -> (模块, 预算毫秒, 不应导入的模块)
+ENTRY_POINTS = {
+    "cli": ("douban2notion.cli", 20, ["dotenv", "httpx", "notion_client", "pendulum", "requests"]),
+    "heatmap": ("douban2notion.update_heatmap", 150, ["pendulum", "requests", "douban2notion.douban"]),
+    "sync": ("douban2notion.douban", 300, ["dotenv"]),
+    "watch": ("douban2notion.watch", 300, ["dotenv"]),
+    "multi": ("douban2notion.multi", 300, ["dotenv"]),
+}
+
+
+def measure_import(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # 每行格式为 "import time: self [us] | cumulative | imported package"
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if cumulative.strip().isdigit():
+            imported[name.strip()] = int(cumulative)
+    return imported[module] / 1000, set(imported)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="预算倍数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    options = parser.parse_args()
+
+    rows = []
+    for entry, (module, budget, forbidden) in ENTRY_POINTS.items():
+        samples = []
+        imported = set()
+        for _ in range(options.repeat):
+            elapsed, imported = measure_import(module)
+            samples.append(elapsed)
+        rows.append({
+            "entry": entry,
+            "module": module,
+            "import_ms": round(statistics.median(samples), 1),
+            "budget_ms": budget * options.scale,
+            "unexpected": sorted(name for name in forbidden if name in imported),
+        })
+
+    failed = False
+    print(f"{'entry':<8} {'import(ms)':>10} {'budget(ms)':>10}  status")
+    for row in rows:
+        problems = []
+        if row["import_ms"] > row["budget_ms"]:
+            problems.append("over budget")
+        if row["unexpected"]:
+            problems.append(f"imports {', '.join(row['unexpected'])}")
+        failed = failed or bool(problems)
+        print(f"{row['entry']:<8} {row['import_ms']:>10} {row['budget_ms']:>10g}  {'; '.join(problems) or 'ok'}")
+
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as file:
+            json.dump(rows, file, ensure_ascii=False, indent=2)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""端到端同步基准测试，使用 fake_services 中的本地豆瓣和 Notion 服务。
+
+    python -m benchmarks.bench_sync --sizes 100,1000,10000 --latency 0.01 --error-rate 0.01
+
+每个规模依次运行 first-sync、steady-state 和 backfill 三个场景，
+输出耗时、各接口请求数和同步进程的峰值内存。
+"""
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fake_services import FakeDouban, FakeNotion, make_interests
+
+SCENARIOS = ["first-sync", "steady-state", "backfill"]
+
+
+def run_sync(env, args, log_path, cwd):
+    start = time.perf_counter()
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "douban2notion.douban", "movie", *args],
+            env=env,
+            cwd=cwd,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        _, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        with open(log_path, encoding="utf-8", errors="replace") as log:
+            tail = log.read()[-2000:]
+        raise RuntimeError(f"sync exited with status {status}:\n{tail}")
+    max_rss = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return elapsed, max_rss
+
+
+def add_new_interests(interests, count):
+    latest = datetime.strptime(interests[0]["create_time"], "%Y-%m-%d %H:%M:%S")
+    template = interests[-1]
+    new = []
+    for i in range(count):
+        interest = copy.deepcopy(template)
+        interest["id"] = 9000000 + i
+        interest["status"] = "done"
+        interest["create_time"] = (latest + timedelta(hours=i + 1)).strftime("%Y-%m-%d %H:%M:%S")
+        interest["subject"]["title"] = f"新电影 {i}"
+        interest["subject"]["url"] = f"https://movie.douban.com/subject/{9000000 + i}/"
+        new.append(interest)
+    new.reverse()
+    return new + interests
+
+
+def change_comments(interests, ratio):
+    step = max(1, int(1 / ratio))
+    for interest in interests[::step]:
+        interest["comment"] = f"{interest['comment']} (改)"
+    return interests
+
+
+def run_size(size, options, workdir):
+    douban = FakeDouban(latency=options.latency, error_rate=0).start()
+    notion = FakeNotion(latency=options.latency, error_rate=options.error_rate).start()
+    state_dir = os.path.join(workdir, f"state-{size}")
+    os.makedirs(state_dir, exist_ok=True)
+    log_path = os.path.join(workdir, f"sync-{size}.log")
+    env = {
+        "PATH": os.environ.get("PATH", ""),
+        "PYTHONPATH": os.pathsep.join([os.getcwd(), os.environ.get("PYTHONPATH", "")]),
+        "NOTION_TOKEN": "fake-token",
+        "NOTION_MOVIE_URL": notion.page_url,
+        "NOTION_BASE_URL": notion.url,
+        "DOUBAN_NAME": "bench",
+        "DOUBAN_API_URL": douban.url,
+        "STATE_DIR": state_dir,
+        "NOTION_RATE_LIMIT": str(options.notion_rate),
+        "DOUBAN_RATE_LIMIT": str(options.douban_rate),
+    }
+    extra_args = list(options.sync_args)
+
+    interests = make_interests(size)
+    plans = {
+        "first-sync": (interests, ["--full"]),
+        "steady-state": (add_new_interests(interests, 3), []),
+        "backfill": (change_comments(copy.deepcopy(add_new_interests(interests, 3)), 0.1), ["--full"]),
+    }
+
+    rows = []
+    try:
+        for scenario in SCENARIOS:
+            scenario_interests, args = plans[scenario]
+            douban.set_interests(scenario_interests)
+            douban.reset_counts()
+            notion.reset_counts()
+            elapsed, max_rss = run_sync(env, args + extra_args, log_path, state_dir)
+            if scenario not in options.scenarios:
+                continue
+            counts = dict(douban.counts)
+            counts.update(notion.counts)
+            rows.append({
+                "size": size,
+                "scenario": scenario,
+                "wall_time": round(elapsed, 2),
+                "requests": sum(counts.values()),
+                "requests_by_endpoint": dict(sorted(counts.items())),
+                "peak_rss_mb": round(max_rss, 1),
+            })
+    finally:
+        douban.stop()
+        notion.stop()
+    return rows
+
+
+def print_table(rows):
+    print(f"{'size':>6} {'scenario':<13} {'wall(s)':>8} {'requests':>9} {'rss(MB)':>8}  endpoints")
+    for row in rows:
+        endpoints = ", ".join(f"{name}={count}" for name, count in row["requests_by_endpoint"].items())
+        print(
+            f"{row['size']:>6} {row['scenario']:<13} {row['wall_time']:>8} "
+            f"{row['requests']:>9} {row['peak_rss_mb']:>8}  {endpoints}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Notion 接口随机返回 429 的比例")
+    parser.add_argument("--notion-rate", type=float, default=0, help="同步进程的 NOTION_RATE_LIMIT，0 为不限速")
+    parser.add_argument("--douban-rate", type=float, default=0, help="同步进程的 DOUBAN_RATE_LIMIT，0 为不限速")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("sync_args", nargs="*", help="透传给 douban 命令的参数，放在 -- 之后")
+    options = parser.parse_args()
+    options.scenarios = options.scenarios.split(",")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(size) for size in options.sizes.split(",")):
+            rows.extend(run_size(size, options, workdir))
+    print_table(rows)
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as file:
+            json.dump(rows, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
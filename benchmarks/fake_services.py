@@ -0,0 +1,267 @@
+"""本地模拟的豆瓣和 Notion 接口，供基准测试使用。
+
+只实现同步流程实际调用到的接口，支持配置延迟、随机 429 和数据规模。
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+GENRES = ["剧情", "喜剧", "动作", "爱情", "科幻", "动画", "悬疑", "惊悚", "恐怖", "犯罪",
+          "纪录片", "冒险", "奇幻", "家庭", "历史", "战争", "音乐", "传记", "武侠", "西部"]
+STATUSES = ["mark", "doing", "done"]
+DATABASE_NAMES = ["电影", "日", "周", "月", "年", "分类", "导演"]
+HEATMAP_URL = "https://heatmap.malinkang.com/?image=https://example.github.io/repo/OUT_FOLDER/movie/0.svg"
+
+
+def make_interests(size, seed=0, start=datetime(2015, 1, 1, 8, 0)):
+    rng = random.Random(seed)
+    interests = []
+    for i in range(size):
+        roll = rng.random()
+        status = "mark" if roll < 0.1 else "doing" if roll < 0.15 else "done"
+        create_time = start + timedelta(hours=7 * i, minutes=rng.randrange(60))
+        interests.append({
+            "id": 1000000 + i,
+            "status": status,
+            "create_time": create_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "comment": f"短评 {i}" if rng.random() < 0.6 else "",
+            "rating": {"value": rng.randint(1, 5) if status == "done" else 0},
+            "subject": {
+                "title": f"电影 {i}",
+                "url": f"https://movie.douban.com/subject/{2000000 + i}/",
+                "type": "movie",
+                "genres": rng.sample(GENRES, 2),
+                "directors": [{"name": f"导演 {rng.randrange(max(1, size // 3))}"}],
+                "actors": [{"name": f"演员 {rng.randrange(size * 2)}"} for _ in range(3)],
+                "pic": {"normal": f"https://img.example.com/{i}.webp"},
+            },
+        })
+    interests.reverse()
+    return interests
+
+
+class FakeService:
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.server = None
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts.clear()
+
+    def count(self, endpoint):
+        with self.lock:
+            self.counts[endpoint] += 1
+            return self.error_rate and self.rng.random() < self.error_rate
+
+    def start(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def handle_request(self, method):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("content-length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                if service.latency:
+                    time.sleep(service.latency)
+                endpoint, status, payload = service.route(method, parsed.path, parse_qs(parsed.query), body)
+                if endpoint and service.count(endpoint):
+                    status, payload = 429, {"object": "error", "status": 429, "code": "rate_limited",
+                                            "message": "Rate limited"}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                if status == 429:
+                    self.send_header("retry-after", "0")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def do_PATCH(self):
+                self.handle_request("PATCH")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def route(self, method, path, query, body):
+        raise NotImplementedError
+
+
+class FakeDouban(FakeService):
+    def __init__(self, interests=None, **kwargs):
+        super().__init__(**kwargs)
+        self.set_interests(interests or [])
+
+    def set_interests(self, interests):
+        self.by_status = {status: [i for i in interests if i["status"] == status] for status in STATUSES}
+
+    def route(self, method, path, query, body):
+        match = re.fullmatch(r"/api/v2/user/[^/]+/interests", path)
+        if method != "GET" or not match:
+            return None, 404, {"msg": "not found"}
+        interests = self.by_status.get(query.get("status", [""])[0], [])
+        start = int(query.get("start", ["0"])[0])
+        count = int(query.get("count", ["50"])[0])
+        return "douban interests", 200, {
+            "start": start,
+            "count": count,
+            "total": len(interests),
+            "interests": interests[start:start + count],
+        }
+
+
+def to_response_property(value):
+    prop_type = next(iter(value))
+    content = value[prop_type]
+    if prop_type in ("title", "rich_text"):
+        content = [
+            dict(item, plain_text=item.get("text", {}).get("content", "")) for item in content or []
+        ]
+    if prop_type == "date" and content and content.get("time_zone"):
+        # 和 Notion 一样，把带 time_zone 的本地时间转换为带偏移的 ISO 时间返回
+        tz = ZoneInfo(content["time_zone"])
+        content = {
+            key: datetime.fromisoformat(content[key]).replace(tzinfo=tz).isoformat(timespec="milliseconds")
+            if content.get(key) else None
+            for key in ("start", "end")
+        }
+        content["time_zone"] = None
+    return {"type": prop_type, prop_type: content}
+
+
+class FakeNotion(FakeService):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.root_id = uuid.uuid4().hex
+        self.databases = {}
+        self.pages = {}
+        self.children = {self.root_id: []}
+        for name in DATABASE_NAMES:
+            database_id = str(uuid.uuid4())
+            self.databases[database_id] = {"title": name, "pages": []}
+            self.children[self.root_id].append({
+                "object": "block", "id": database_id, "type": "child_database",
+                "has_children": False, "child_database": {"title": name},
+            })
+        self.children[self.root_id].append({
+            "object": "block", "id": str(uuid.uuid4()), "type": "embed",
+            "has_children": False, "embed": {"url": HEATMAP_URL},
+        })
+
+    @property
+    def page_url(self):
+        return f"https://www.notion.so/fake-{self.root_id}"
+
+    def database_id(self, name):
+        return next(key for key, value in self.databases.items() if value["title"] == name)
+
+    def now(self):
+        return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+    def create_page(self, database_id, properties, icon=None):
+        page_id = str(uuid.uuid4())
+        page = {
+            "object": "page", "id": page_id, "archived": False, "in_trash": False,
+            "created_time": self.now(), "last_edited_time": self.now(), "icon": icon,
+            "parent": {"type": "database_id", "database_id": database_id},
+            "properties": {key: to_response_property(value) for key, value in properties.items()},
+        }
+        with self.lock:
+            self.pages[page_id] = page
+            self.databases[database_id]["pages"].append(page_id)
+        return page
+
+    def matches(self, page, filter):
+        if not filter:
+            return True
+        if filter.get("timestamp") == "last_edited_time":
+            return page["last_edited_time"] >= filter["last_edited_time"]["on_or_after"][:16]
+        prop = page["properties"].get(filter.get("property"), {})
+        if "title" in filter:
+            texts = prop.get("title") or []
+            return texts and texts[0].get("plain_text") == filter["title"]["equals"]
+        if "url" in filter:
+            return prop.get("url") == filter["url"]["equals"]
+        return True
+
+    def paginate(self, items, start_cursor, page_size):
+        start = int(start_cursor or 0)
+        page_size = int(page_size or 100)
+        end = start + page_size
+        return {
+            "object": "list",
+            "results": items[start:end],
+            "next_cursor": str(end) if end < len(items) else None,
+            "has_more": end < len(items),
+        }
+
+    def route(self, method, path, query, body):
+        parts = path.strip("/").split("/")[1:]
+        if parts[:1] == ["blocks"] and parts[2:] == ["children"] and method == "GET":
+            children = self.children.get(parts[1].replace("-", ""), self.children.get(parts[1], []))
+            return "notion blocks.children.list", 200, self.paginate(
+                children, query.get("start_cursor", [None])[0], query.get("page_size", [100])[0]
+            )
+        if parts[:1] == ["blocks"] and len(parts) == 2 and method == "PATCH":
+            return "notion blocks.update", 200, {"object": "block", "id": parts[1]}
+        if parts[:1] == ["databases"] and len(parts) == 2 and method == "GET":
+            if parts[1] not in self.databases:
+                return "notion databases.retrieve", 404, {"object": "error", "status": 404,
+                                                          "code": "object_not_found", "message": "missing"}
+            return "notion databases.retrieve", 200, {"object": "database", "id": parts[1], "archived": False}
+        if parts[:1] == ["databases"] and parts[2:] == ["query"] and method == "POST":
+            database = self.databases[parts[1]]
+            with self.lock:
+                pages = [self.pages[page_id] for page_id in database["pages"]]
+            pages = [page for page in pages if self.matches(page, body.get("filter"))]
+            return "notion databases.query", 200, self.paginate(
+                pages, body.get("start_cursor"), body.get("page_size")
+            )
+        if parts == ["pages"] and method == "POST":
+            page = self.create_page(body["parent"]["database_id"], body.get("properties", {}), body.get("icon"))
+            return "notion pages.create", 200, page
+        if parts[:1] == ["pages"] and len(parts) == 2:
+            page = self.pages.get(parts[1])
+            if page is None:
+                return "notion pages.retrieve", 404, {"object": "error", "status": 404,
+                                                      "code": "object_not_found", "message": "missing"}
+            if method == "PATCH":
+                with self.lock:
+                    for key, value in body.get("properties", {}).items():
+                        page["properties"][key] = to_response_property(value)
+                    page["last_edited_time"] = self.now()
+                return "notion pages.update", 200, page
+            return "notion pages.retrieve", 200, page
+        return None, 404, {"object": "error", "status": 404, "code": "object_not_found", "message": path}
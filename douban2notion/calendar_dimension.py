@@ -0,0 +1,88 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from douban2notion.config import TARGET_ICON_URL
+from douban2notion.utils import get_relation
+
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", 3))
+
+
+class CalendarDimension:
+    def __init__(self, notion_helper):
+        self.helper = notion_helper
+        self.day_keys = {}
+        self.bucket_ids = {}
+        self.relations = {}
+
+    def get_day_key(self, date):
+        day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        key = day.strftime("%Y%m%d")
+        self.day_keys.setdefault(key, day)
+        return key
+
+    def prepare(self, dates):
+        # 先算出这一批日期涉及的年/月/周/日，再按“父级优先”分两批并发解析，每个桶只查一次
+        days = {}
+        for date in dates:
+            key = self.get_day_key(date)
+            if key not in self.relations and key not in days:
+                days[key] = self.helper.get_date_buckets(self.day_keys[key])
+        if not days:
+            return
+
+        self.resolve({
+            (database_id, title): properties
+            for buckets in days.values()
+            for name, (database_id, (title, properties)) in buckets.items()
+            if name != "日"
+        })
+
+        children = {}
+        for buckets in days.values():
+            database_id, (title, properties) = buckets["日"]
+            for name in ("年", "月", "周"):
+                properties[name] = get_relation([self.get_bucket_id(*buckets[name])])
+            children[(database_id, title)] = properties
+        self.resolve(children)
+
+        for key, buckets in days.items():
+            self.relations[key] = {
+                name: get_relation([self.get_bucket_id(*bucket)]) for name, bucket in buckets.items()
+            }
+
+    def get_bucket_id(self, database_id, bucket):
+        return self.bucket_ids[(database_id, bucket[0])]
+
+    def resolve(self, buckets):
+        pending = [key for key in buckets if key not in self.bucket_ids]
+        if not pending:
+            return
+
+        def resolve_one(key):
+            database_id, title = key
+            return self.helper.get_relation_id(title, database_id, TARGET_ICON_URL, buckets[key])
+
+        with ThreadPoolExecutor(max_workers=CALENDAR_CONCURRENCY) as executor:
+            for key, page_id in zip(pending, executor.map(resolve_one, pending)):
+                self.bucket_ids[key] = page_id
+
+    def forget(self, page_id):
+        normalized = page_id.replace("-", "")
+        for key in [key for key, value in self.bucket_ids.items() if value.replace("-", "") == normalized]:
+            del self.bucket_ids[key]
+        for key in [
+            key
+            for key, relations in self.relations.items()
+            if any(
+                relation["id"].replace("-", "") == normalized
+                for value in relations.values()
+                for relation in value["relation"]
+            )
+        ]:
+            del self.relations[key]
+
+    def get_relations(self, date):
+        key = self.get_day_key(date)
+        if key not in self.relations:
+            self.prepare([date])
+        return dict(self.relations[key])
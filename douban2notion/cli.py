@@ -0,0 +1,56 @@
+import argparse
+import importlib
+import sys
+
+# 子命令 -> (模块, 固定参数, 说明)；模块在选中子命令后才导入，
+# `douban2notion heatmap` 不会加载豆瓣抓取相关的模块，`--help` 也不会加载任何依赖
+COMMANDS = {
+    "sync": ("douban2notion.douban", [], "同步豆瓣电影到 Notion"),
+    "plan": ("douban2notion.douban", ["--plan"], "只对比差异并列出将要执行的写入，不修改 Notion"),
+    "heatmap": ("douban2notion.update_heatmap", [], "用上次同步保存的统计重新渲染并发布热力图"),
+    "watch": ("douban2notion.watch", [], "常驻运行，定期把豆瓣的新标记同步到 Notion"),
+    "multi": ("douban2notion.multi", [], "按配置文件同时同步多个豆瓣账号"),
+}
+
+
+def run(command, args):
+    from dotenv import load_dotenv
+
+    # 先加载 .env 再导入子命令模块，模块级读取的环境变量才能拿到 .env 中的值
+    load_dotenv()
+    module_name, fixed_args, _ = COMMANDS[command]
+    importlib.import_module(module_name).main([*fixed_args, *args])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="douban2notion",
+        description="同步豆瓣电影到 Notion",
+        epilog="\n".join(f"  {name:<8} {help}" for name, (_, _, help) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=COMMANDS, help="子命令，`<command> --help` 查看各自的参数")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+    run(options.command, options.args)
+
+
+# 兼容原有的控制台命令，行为与对应的子命令相同
+def douban():
+    run("sync", sys.argv[1:])
+
+
+def heatmap():
+    run("heatmap", sys.argv[1:])
+
+
+def watch():
+    run("watch", sys.argv[1:])
+
+
+def multi():
+    run("multi", sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ MULTI_SELECT = "multi_select"
 
 TAG_ICON_URL = "https://www.notion.so/icons/tag_gray.svg"
 USER_ICON_URL = "https://www.notion.so/icons/user-circle-filled_gray.svg"
+TARGET_ICON_URL = "https://www.notion.so/icons/target_red.svg"
 
 movie_properties_type_dict = {
     "电影名": TITLE,
@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+from douban2notion.state import get_state_path
+from douban2notion.transport import get_transport
+
+COVER_CACHE_DIR = "covers"
+COVER_CACHE_INDEX = "cover_cache.sqlite"
+COVER_CACHE_SIZE = int(os.getenv("COVER_CACHE_SIZE", 512))  # MB
+COVER_EVICT_INTERVAL = int(os.getenv("COVER_EVICT_INTERVAL", 64))
+COVER_CACHE_TTL = int(os.getenv("COVER_CACHE_TTL", 30 * 24 * 3600))
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_URL = "https://wereadassets.malinkang.com/"
+
+_cover_cache = None
+_cover_cache_lock = threading.Lock()
+
+
+class Base64JsonBody:
+    # 以文件对象的形式按块生成 {"filename", "folder", "file": <base64>} 请求体，长度预先算好，无需一次性编码整个文件
+    def __init__(self, file_path, fields):
+        self.file = open(file_path, "rb")
+        size = os.path.getsize(file_path)
+        self.prefix = (json.dumps(fields, ensure_ascii=False)[:-1] + ', "file": "').encode("utf-8")
+        self.suffix = b'"}'
+        self.length = len(self.prefix) + (size + 2) // 3 * 4 + len(self.suffix)
+        self.buffer = self.prefix
+        self.done = False
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        while len(self.buffer) < size and not self.done:
+            # 3 的整数倍字节编码后不会产生中间的填充字符
+            chunk = self.file.read(CHUNK_SIZE // 3 * 3)
+            if chunk:
+                self.buffer += base64.b64encode(chunk)
+            else:
+                self.buffer += self.suffix
+                self.done = True
+                self.file.close()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class CoverCache:
+    def __init__(self, directory=None, max_bytes=None, ttl=None, transport=None, evict_interval=None):
+        self.directory = directory or get_state_path(COVER_CACHE_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes or COVER_CACHE_SIZE * 1024 * 1024
+        self.evict_interval = evict_interval or COVER_EVICT_INTERVAL
+        self.inserted = 0
+        self.ttl = COVER_CACHE_TTL if ttl is None else ttl
+        self.transport = transport or get_transport()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.directory, COVER_CACHE_INDEX), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cover ("
+            "url TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, etag TEXT, "
+            "last_modified TEXT, validated_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cover_used_at ON cover (used_at)")
+        self.conn.commit()
+
+    def get_path(self, digest, url):
+        extension = os.path.splitext(urlparse(url).path)[1] or ".jpg"
+        return os.path.join(self.directory, f"{digest}{extension}")
+
+    def lookup(self, url):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT digest, size, etag, last_modified, validated_at FROM cover WHERE url = ?", (url,)
+            ).fetchone()
+
+    def touch(self, url, validated=False):
+        now = time.time()
+        with self.lock:
+            if validated:
+                self.conn.execute(
+                    "UPDATE cover SET used_at = ?, validated_at = ? WHERE url = ?", (now, now, url)
+                )
+            else:
+                self.conn.execute("UPDATE cover SET used_at = ? WHERE url = ?", (now, url))
+            self.conn.commit()
+
+    def get(self, url):
+        # 返回本地文件路径；过期的条目用 ETag/Last-Modified 做条件请求，304 时直接复用
+        row = self.lookup(url)
+        headers = {}
+        if row and os.path.exists(self.get_path(row[0], url)):
+            digest, _, etag, last_modified, validated_at = row
+            if time.time() - validated_at < self.ttl:
+                self.touch(url)
+                return self.get_path(digest, url)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        else:
+            row = None
+
+        with self.transport.get(url, "cover download", headers=headers, stream=True) as response:
+            if response.status_code == 304 and row:
+                self.touch(url, validated=True)
+                return self.get_path(row[0], url)
+            if response.status_code != 200:
+                print(f"Failed to download image {url}. Status code: {response.status_code}")
+                return None
+            digest, size, temp_path = self.write_temp(response)
+
+        path = self.get_path(digest, url)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cover VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, size, response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now),
+            )
+            self.conn.commit()
+            self.inserted += 1
+            evict = self.inserted % self.evict_interval == 0
+        # 缓存通常作为进程级单例使用，不一定有机会 close()；每写入一批新文件就按大小上限淘汰一次
+        if evict:
+            self.evict()
+        return path
+
+    def write_temp(self, response):
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        with os.fdopen(fd, "wb") as file:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                sha256.update(chunk)
+                size += len(chunk)
+                file.write(chunk)
+        return sha256.hexdigest(), size, temp_path
+
+    def upload(self, url, folder="cover"):
+        path = self.get(url)
+        if not path:
+            return None
+        response = upload_file(path, os.path.basename(path), folder)
+        if response.status_code == 200:
+            return response.text
+        print(f"Failed to upload file. Status code: {response.status_code}")
+        return None
+
+    def evict(self):
+        # 按最近使用时间淘汰，直到总大小不超过 max_bytes；同一内容被多个链接引用时，最后一个引用删除后才删文件
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url, digest, size FROM cover ORDER BY used_at DESC"
+            ).fetchall()
+            total = 0
+            kept_digests = set()
+            evicted = []
+            for url, digest, size in rows:
+                if digest in kept_digests:
+                    continue
+                if total + size <= self.max_bytes:
+                    total += size
+                    kept_digests.add(digest)
+                else:
+                    evicted.append((url, digest))
+            for url, _ in evicted:
+                self.conn.execute("DELETE FROM cover WHERE url = ?", (url,))
+            self.conn.commit()
+        for url, digest in evicted:
+            if digest not in kept_digests:
+                path = self.get_path(digest, url)
+                if os.path.exists(path):
+                    os.remove(path)
+        return len(evicted)
+
+    def close(self):
+        self.evict()
+        with self.lock:
+            self.conn.close()
+
+
+def upload_file(file_path, filename, folder):
+    fields = {"filename": filename, "folder": folder}
+    return get_transport().post(
+        UPLOAD_URL,
+        "cover upload",
+        data=lambda: Base64JsonBody(file_path, fields),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+def get_cover_cache():
+    global _cover_cache
+    with _cover_cache_lock:
+        if _cover_cache is None:
+            _cover_cache = CoverCache()
+        return _cover_cache
@@ -0,0 +1,66 @@
+from douban2notion.config import RELATION, RICH_TEXT, SELECT
+from douban2notion.utils import MAX_LENGTH, get_properties
+
+DIFF_FIELDS = ["日期", "短评", "状态", "评分", "分类"]
+
+
+def normalize_text(value):
+    if value is None:
+        return None
+    value = str(value)[:MAX_LENGTH].strip()
+    return value or None
+
+
+def normalize_select(value):
+    return value or None
+
+
+def normalize_date(value):
+    # Notion 中的日期精确到分钟，缺失时 get_property_value 返回 0
+    if not value:
+        return None
+    return int(value) // 60 * 60
+
+
+def normalize_relation(value):
+    # Notion 返回 [{"id": ...}]，豆瓣侧是 id 列表；统一为去掉连字符后排序的元组
+    ids = set()
+    for item in value or []:
+        if isinstance(item, dict):
+            item = item.get("id")
+        if item:
+            ids.add(item.replace("-", ""))
+    return tuple(sorted(ids))
+
+
+normalizers = {
+    "日期": normalize_date,
+    "短评": normalize_text,
+    "状态": normalize_select,
+    "评分": normalize_select,
+    "分类": normalize_relation,
+}
+
+
+def diff_movie(existing, movie_data, fields=DIFF_FIELDS):
+    return [
+        field
+        for field in fields
+        if normalizers[field](existing.get(field)) != normalizers[field](movie_data.get(field))
+    ]
+
+
+def get_changed_properties(movie_data, changed, type_map):
+    properties = get_properties({field: movie_data.get(field) for field in changed}, type_map)
+    # get_properties 会跳过 None，被清空的字段需要显式置空，否则每次运行都会被判定为变更
+    for field in changed:
+        if field in properties:
+            continue
+        prop_type = type_map.get(field)
+        if prop_type == RICH_TEXT:
+            properties[field] = {"rich_text": []}
+        elif prop_type == SELECT:
+            properties[field] = {"select": None}
+        elif prop_type == RELATION:
+            properties[field] = {"relation": []}
+    return properties
@@ -1,26 +1,49 @@
+import argparse
 import json
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import pendulum
-from retrying import retry
-import requests
+from douban2notion.journal import SyncJournal
+from douban2notion.movie_mirror import MovieMirror, decode_movie_page, movie_codec
 from douban2notion.notion_helper import NotionHelper
+from douban2notion.records import DoubanMovie
 from douban2notion import utils
+from douban2notion.diff import diff_movie, get_changed_properties, normalize_date
+from douban2notion.metrics import metrics, profiled, write_report
 from douban2notion.config import movie_properties_type_dict, TAG_ICON_URL, USER_ICON_URL
+from douban2notion.ratelimit import get_host_limiter
+from douban2notion.state import load_state, update_state
+from douban2notion.transport import CircuitBreaker, get_transport
+from douban2notion.update_heatmap import refresh_heatmap
 from douban2notion.utils import get_icon
-from dotenv import load_dotenv
-
-load_dotenv()
 
 DOUBAN_API_HOST = os.getenv("DOUBAN_API_HOST", "frodo.douban.com")
+DOUBAN_API_URL = os.getenv("DOUBAN_API_URL", f"https://{DOUBAN_API_HOST}")
 DOUBAN_API_KEY = os.getenv("DOUBAN_API_KEY", "0ac44ae016490db2204ce0a042db2916")
-AUTH_TOKEN = os.getenv("AUTH_TOKEN")
+DOUBAN_CONCURRENCY = int(os.getenv("DOUBAN_CONCURRENCY", 4))
+DOUBAN_RATE_LIMIT = float(os.getenv("DOUBAN_RATE_LIMIT", 5))
+PAGE_SIZE = 50
+PIPELINE_BUFFER = int(os.getenv("PIPELINE_BUFFER", 8))
+STREAM_POLL_INTERVAL = 0.5
+
+douban_limiter = get_host_limiter(DOUBAN_API_HOST, DOUBAN_RATE_LIMIT)
+douban_breaker = CircuitBreaker("Douban", int(os.getenv("DOUBAN_AUTH_FAILURES", 3)))
+
+
+@lru_cache(maxsize=None)
+def get_headers():
+    # 第一次请求时才读取 AUTH_TOKEN，此时命令行入口已经加载过 .env
+    auth_token = os.getenv("AUTH_TOKEN")
+    return {
+        "host": DOUBAN_API_HOST,
+        "authorization": f"Bearer {auth_token}" if auth_token else "",
+        "user-agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 15_3 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 MicroMessenger/8.0.16(0x18001023) NetType/WIFI Language/zh_CN",
+        "referer": "https://servicewechat.com/wx2f9b06c1de1ccfca/84/page-frame.html",
+    }
 
-headers = {
-    "host": DOUBAN_API_HOST,
-    "authorization": f"Bearer {AUTH_TOKEN}" if AUTH_TOKEN else "",
-    "user-agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 15_3 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 MicroMessenger/8.0.16(0x18001023) NetType/WIFI Language/zh_CN",
-    "referer": "https://servicewechat.com/wx2f9b06c1de1ccfca/84/page-frame.html",
-}
 
 rating = {
     1: "⭐️",
@@ -36,122 +59,431 @@ movie_status = {
     "done": "看过",
 }
 
-@retry(stop_max_attempt_number=3, wait_fixed=5000)
-def fetch_movies(user, status):
-    offset = 0
-    results = []
-    url = f"https://{DOUBAN_API_HOST}/api/v2/user/{user}/interests"
-
-    while True:
-        params = {
-            "type": "movie",
-            "count": 50,
-            "status": status,
-            "start": offset,
-            "apiKey": DOUBAN_API_KEY,
-        }
-        response = requests.get(url, headers=headers, params=params)
-
-        if response.ok:
-            data = response.json()
+WATERMARK_STATE = "watermark.json"
+
+
+class DoubanFetchError(Exception):
+    pass
+
+
+def reached_watermark(interest, watermark):
+    # 豆瓣按标记时间倒序返回，遇到水位（或水位时刻已同步过的条目）即可停止翻页
+    if not watermark:
+        return False
+    create_time = interest.get("create_time") or ""
+    if create_time != watermark.get("create_time"):
+        return create_time < watermark.get("create_time", "")
+    return str(interest.get("id")) in watermark.get("ids", [])
+
+
+def build_watermark(interests, previous=None):
+    if not interests:
+        return previous
+    latest = max(interest.get("create_time") or "" for interest in interests)
+    ids = {str(interest.get("id")) for interest in interests if interest.get("create_time") == latest}
+    if previous and previous.get("create_time", "") > latest:
+        return previous
+    if previous and previous.get("create_time") == latest:
+        ids |= set(previous.get("ids", []))
+    return {"create_time": latest, "ids": sorted(ids)}
+
+
+def fetch_page(user, status, start):
+    url = f"{DOUBAN_API_URL}/api/v2/user/{user}/interests"
+    params = {
+        "type": "movie",
+        "count": PAGE_SIZE,
+        "status": status,
+        "start": start,
+        "apiKey": DOUBAN_API_KEY,
+    }
+    response = get_transport().get(
+        url,
+        "douban interests",
+        headers=get_headers(),
+        params=params,
+        limiter=douban_limiter,
+        breaker=douban_breaker,
+    )
+    if not response.ok:
+        # 不能把失败的页面当作列表结束，否则水位会越过后面没有抓到的条目
+        raise DoubanFetchError(
+            f"Failed to fetch '{movie_status[status]}' movies at offset {start}: {response.status_code}"
+        )
+    return response.json()
+
+
+def iter_movie_pages(user, status, watermark=None, executor=None, start=0):
+    # 逐页返回 (offset, interests)；start 用于从检查点恢复，跳过已经处理完的页面
+    data = fetch_page(user, status, start)
+    interests = data.get("interests", [])
+    if not interests:
+        return
+
+    total = data.get("total")
+    if watermark or executor is None or not total:
+        # 增量模式必须顺序翻页，才能在水位处提前停止
+        offset = start
+        while interests:
+            fresh = [interest for interest in interests if not reached_watermark(interest, watermark)]
+            if fresh:
+                yield offset, fresh
+            if len(fresh) < len(interests):
+                return
+            offset += PAGE_SIZE
+            data = fetch_page(user, status, offset)
             interests = data.get("interests", [])
-            if not interests:
-                break
-            results.extend(interests)
-            offset += 50
+        return
+
+    yield start, interests
+    # 按并发数分批并发请求，既能重叠网络延迟，又不会一次性把整个库缓存在内存里
+    offsets = list(range(start + PAGE_SIZE, total, PAGE_SIZE))
+    for i in range(0, len(offsets), DOUBAN_CONCURRENCY):
+        window = offsets[i:i + DOUBAN_CONCURRENCY]
+        for offset, page in zip(window, executor.map(lambda offset: fetch_page(user, status, offset), window)):
+            page_interests = page.get("interests", [])
+            if not page_interests:
+                return
+            yield offset, page_interests
+
+
+@metrics.traced("fetch_movies")
+def fetch_movies(user, status, watermark=None, executor=None):
+    return [
+        interest
+        for _, interests in iter_movie_pages(user, status, watermark, executor)
+        for interest in interests
+    ]
+
+
+class MovieStream:
+    # 每个状态一个后台线程抓取豆瓣页面，放入有界队列由主线程消费；
+    # 消费方出错时调用 close()，阻塞在队列上的抓取线程随之退出，常驻进程中不会累积线程
+    done = object()
+
+    def __init__(self, user, watermarks=None, offsets=None, buffer_size=PIPELINE_BUFFER):
+        watermarks = watermarks or {}
+        offsets = offsets or {}
+        self.pages = queue.Queue(maxsize=buffer_size)
+        self.stopped = threading.Event()
+        self.page_executor = ThreadPoolExecutor(max_workers=DOUBAN_CONCURRENCY)
+        for status in movie_status.keys():
+            threading.Thread(
+                target=self.produce,
+                args=(user, status, watermarks.get(status), offsets.get(status, 0)),
+                daemon=True,
+            ).start()
+
+    def put(self, item):
+        # 带超时地等待队列空位，期间检查是否已停止
+        while not self.stopped.is_set():
+            try:
+                self.pages.put(item, timeout=STREAM_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(self, user, status, watermark, start):
+        try:
+            for offset, interests in iter_movie_pages(user, status, watermark, self.page_executor, start):
+                if not self.put((status, offset, interests)):
+                    return
+        except Exception as e:
+            self.put((status, None, e))
+        finally:
+            self.put((status, None, self.done))
+
+    def __iter__(self):
+        remaining = len(movie_status)
+        try:
+            while remaining:
+                status, offset, item = self.pages.get()
+                if item is self.done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield status, offset, item
+        finally:
+            self.close()
+
+    def close(self):
+        self.stopped.set()
+        self.page_executor.shutdown(wait=False)
+
+
+def fetch_all_movies(user, watermarks=None):
+    watermarks = watermarks or {}
+    with ThreadPoolExecutor(max_workers=DOUBAN_CONCURRENCY) as page_executor:
+        with ThreadPoolExecutor(max_workers=len(movie_status)) as status_executor:
+            futures = {
+                status: status_executor.submit(
+                    fetch_movies, user, status, watermarks.get(status), page_executor
+                )
+                for status in movie_status.keys()
+            }
+            return {status: future.result() for status, future in futures.items()}
+
+
+def parse_interest(movie_entry):
+    subject = movie_entry.get("subject")
+    return DoubanMovie(
+        title=subject.get("title"),
+        date=pendulum.parse(movie_entry.get("create_time"), tz=utils.tz).replace(second=0).int_timestamp,
+        url=subject.get("url"),
+        status=movie_status.get(movie_entry.get("status")),
+        rating=rating.get(movie_entry.get("rating", {}).get("value")),
+        comment=movie_entry.get("comment"),
+        genres=subject.get("genres", []),
+        cover=subject.get("pic", {}).get("normal", "").replace(".webp", ".jpg"),
+        type=subject.get("type"),
+        actors=[actor.get("name") for actor in subject.get("actors", []) if actor.get("name")],
+        directors=[director.get("name") for director in subject.get("directors", [])],
+    )
+
+
+def parse_interests(interests):
+    return [parse_interest(movie_entry) for movie_entry in interests if movie_entry.get("subject")]
+
+
+def add_new_movie_fields(movie_data, movie):
+    movie_data["封面"] = movie.cover
+    movie_data["类型"] = movie.type
+    if movie.actors:
+        movie_data["演员"] = list(movie.actors)
+    return movie.cover
+
+
+def save_watermarks(watermark_key, new_watermarks):
+    watermarks = {status: watermark for status, watermark in new_watermarks.items() if watermark}
+    update_state(WATERMARK_STATE, lambda state: state.update({watermark_key: watermarks}), {})
+
+
+def needs_date_relation(movie, movie_dict):
+    existing_movie = movie_dict.get(movie.url)
+    return existing_movie is None or normalize_date(existing_movie.date) != movie.date
+
+
+def resolve_genres(movie_data, notion_helper):
+    movie_data["分类"] = [
+        notion_helper.get_relation_id(genre, notion_helper.category_database_id, TAG_ICON_URL)
+        for genre in movie_data["分类"]
+    ]
+
+
+def sync_movie(movie, movie_dict, notion_helper, checkpoint=None):
+    movie_data = movie.to_movie_data()
+    movie_data["分类"] = list(movie.genres)
+    existing_movie = movie_dict.get(movie.url)
+
+    if existing_movie:
+        # 先用分类名字比较，只有确实需要写入时才解析关联 id
+        existing_genres = notion_helper.get_relation_names(
+            notion_helper.category_database_id, existing_movie.categories
+        )
+        if existing_genres is None:
+            resolve_genres(movie_data, notion_helper)
+            changed = diff_movie(existing_movie, movie_data)
         else:
-            print(f"Failed to fetch data for status {status}: {response.status_code}")
-            break
-        
-    # if results:
-    #     print(json.dumps(results[0], indent=4, ensure_ascii=False))
+            changed = diff_movie(existing_movie.replace(分类=existing_genres), movie_data)
+            if "分类" in changed:
+                resolve_genres(movie_data, notion_helper)
+        if not changed:
+            return "unchanged"
+        print(f"更新 {movie_data.get('电影名')}: {', '.join(changed)}")
+        properties = get_changed_properties(movie_data, changed, movie_properties_type_dict)
+        if "日期" in changed:
+            notion_helper.get_date_relation(properties, utils.get_local_date(movie_data["日期"]))
+        if checkpoint:
+            checkpoint.plan("update", movie_data["豆瓣链接"])
+        notion_helper.submit_update_page(
+            existing_movie.page_id,
+            properties,
+            label=movie_data.get("电影名"),
+            on_done=checkpoint.done("update", movie_data["豆瓣链接"]) if checkpoint else None,
+        )
+        return "updated"
 
-    return results
+    print(f"插入 {movie_data.get('电影名')}")
+    resolve_genres(movie_data, notion_helper)
+    cover = add_new_movie_fields(movie_data, movie)
+    if movie.directors:
+        movie_data["导演"] = [
+            notion_helper.get_relation_id(director, notion_helper.director_database_id, USER_ICON_URL)
+            for director in movie.directors
+        ]
+
+    properties = movie_codec.encode(movie_data)
+    notion_helper.get_date_relation(properties, utils.get_local_date(movie_data["日期"]))
+
+    # 先写入计划再创建，崩溃在 create_page 返回之后、记录完成之前时，下次运行能查到这个页面而不是重复创建
+    if checkpoint:
+        checkpoint.plan("create", movie_data["豆瓣链接"])
+    notion_helper.submit_create_page(
+        parent={"database_id": notion_helper.movie_database_id, "type": "database_id"},
+        properties=properties,
+        icon=get_icon(cover),
+        label=movie_data.get("电影名"),
+        on_done=checkpoint.done("create", movie_data["豆瓣链接"]) if checkpoint else None,
+        # 超时后重试前按豆瓣链接确认页面是否已经创建，与恢复中断运行时的查询相同
+        recover=lambda: notion_helper.find_page(
+            notion_helper.movie_database_id, get_movie_filter(movie_data["豆瓣链接"])
+        ),
+    )
+    return "created"
+
+
+@metrics.traced("load_mirrored_movies")
+def load_mirrored_movies(notion_helper, rebuild=False):
+    mirror = MovieMirror(notion_helper.movie_database_id)
+    filter = mirror.begin_refresh(rebuild=rebuild)
+    refreshed = 0
+    for batch in notion_helper.iter_all(notion_helper.movie_database_id, filter=filter):
+        refreshed += mirror.apply(batch)
+    mirror.finish_refresh()
+    print(f"Pulled {refreshed} {'pages' if filter is None else 'edited pages'} into the local mirror")
+    return mirror, mirror.load()
 
 
-def sync_movies(douban_name, notion_helper):
+def get_movie_filter(url):
+    return {"property": "豆瓣链接", "url": {"equals": url}}
+
+
+def confirm_unfinished_creates(journal, notion_helper, movie_dict):
+    # 上次运行中断时可能已经创建了页面但没来得及记录，按豆瓣链接查一次，找到的当作已有电影处理
+    for url in journal.get_unconfirmed_creates():
+        if url in movie_dict:
+            continue
+        response = notion_helper.query(
+            database_id=notion_helper.movie_database_id, filter=get_movie_filter(url)
+        )
+        for page in response.get("results", []):
+            found_url, movie = decode_movie_page(page)
+            movie_dict[found_url] = movie
+            journal.record_found(url, movie.page_id)
+            print(f"Found movie created by the interrupted run: {url}")
+
+
+def sync_movies(
+    douban_name, notion_helper, full=False, rebuild_mirror=False, watermark_key=None, publish_heatmap=True
+):
     if not douban_name:
         print("Error: 请设置 DOUBAN_NAME 环境变量")
         return
 
-    existing_movies = notion_helper.query_all(database_id=notion_helper.movie_database_id)
-    movie_dict = {
-        utils.get_property_value(item.get("properties").get("豆瓣链接")): {
-            "短评": utils.get_property_value(item.get("properties").get("短评")),
-            "状态": utils.get_property_value(item.get("properties").get("状态")),
-            "日期": utils.get_property_value(item.get("properties").get("日期")),
-            "评分": utils.get_property_value(item.get("properties").get("评分")),
-            "page_id": item.get("id"),
-            "分类": utils.get_property_value(item.get("properties").get("分类"))
-        } for item in existing_movies
-    }
+    # 多账号运行时同一个豆瓣用户可能同步到不同的 Notion 页面，水位按调用方给出的 key 分开保存
+    watermark_key = watermark_key or douban_name
 
-    print(f"Found {len(movie_dict)} movies already in Notion")
+    # 计划模式不写入 Notion，也就不需要检查点；被中断的全量同步在下次运行时继续以全量模式完成
+    journal = None if notion_helper.plan else SyncJournal(f"{watermark_key}:{notion_helper.movie_database_id}")
+    resumed = journal is not None and journal.resumed
+    if resumed:
+        full = full or journal.full
+        print("Resuming the interrupted sync from its checkpoint journal")
+    user_watermarks = {} if full else load_state(WATERMARK_STATE, {}).get(watermark_key, {})
+    offsets = journal.get_start_offsets(movie_status.keys(), PAGE_SIZE) if resumed else {}
+    if journal:
+        journal.start(full)
 
-    all_movies = []
-    for status in movie_status.keys():
-        fetched = fetch_movies(douban_name, status)
-        print(f"Fetched {len(fetched)} movies with status '{movie_status[status]}'")
-        all_movies.extend(fetched)
+    # 豆瓣抓取在后台线程中进行，与加载 Notion 已有电影重叠；缓冲区满时抓取线程会阻塞
+    movie_stream = MovieStream(douban_name, user_watermarks, offsets)
+    try:
 
-    for movie_entry in all_movies:
-        subject = movie_entry.get("subject")
-        if not subject:
-            continue
+        # 恢复时镜像已经在被中断的那次运行中重建过，增量刷新即可拿到之后写入的页面
+        mirror, movie_dict = load_mirrored_movies(
+            notion_helper, rebuild=(full and not resumed) or rebuild_mirror
+        )
+        print(f"Found {len(movie_dict)} movies already in Notion")
+        if resumed:
+            confirm_unfinished_creates(journal, notion_helper, movie_dict)
 
-        movie_data = {
-            "电影名": subject.get("title"),
-            "日期": pendulum.parse(movie_entry.get("create_time"), tz=utils.tz).replace(second=0).int_timestamp,
-            "豆瓣链接": subject.get("url"),
-            "状态": movie_status.get(movie_entry.get("status")),
-            "评分": rating.get(movie_entry.get("rating", {}).get("value")),
-            "短评": movie_entry.get("comment"),
-            "分类": [
-                notion_helper.get_relation_id(genre, notion_helper.category_database_id, TAG_ICON_URL)
-                for genre in subject.get("genres", [])
-            ]
-        }
-
-        existing_movie = movie_dict.get(movie_data["豆瓣链接"])
-
-        if existing_movie:
-            if any(
-                existing_movie.get(key) != movie_data.get(key)
-                for key in ["日期", "短评", "状态", "评分", "分类"]
-            ):
-                properties = utils.get_properties(movie_data, movie_properties_type_dict)
-                properties["分类"] = {"relation": [{"id": rel_id} for rel_id in movie_data["分类"]]}
-                notion_helper.get_date_relation(properties, pendulum.from_timestamp(movie_data["日期"]))
-                notion_helper.update_page(page_id=existing_movie["page_id"], properties=properties)
-        else:
-            print(f"插入 {movie_data.get('电影名')}")
-            cover = subject.get("pic", {}).get("normal", "").replace(".webp", ".jpg")
-            movie_data["封面"] = cover
-            movie_data["类型"] = subject.get("type")
-
-            if subject.get("actors"):
-                movie_data["演员"] = [actor.get("name") for actor in subject.get("actors", []) if actor.get("name")]
-            if subject.get("directors"):
-                movie_data["导演"] = [
-                    notion_helper.get_relation_id(director.get("name"), notion_helper.director_database_id, USER_ICON_URL)
-                    for director in subject.get("directors", [])
-                ]
-
-            properties = utils.get_properties(movie_data, movie_properties_type_dict)
-            properties["分类"] = {"relation": [{"id": rel_id} for rel_id in movie_data["分类"]]}
-            notion_helper.get_date_relation(properties, pendulum.from_timestamp(movie_data["日期"]))
-
-            notion_helper.create_page(
-                parent={"database_id": notion_helper.movie_database_id, "type": "database_id"},
-                properties=properties,
-                icon=get_icon(cover)
+        new_watermarks = dict(user_watermarks)
+        if resumed:
+            # 跳过的页面不会重新抓取，沿用日志中记录的水位
+            new_watermarks.update(journal.watermarks)
+        fetched = {status: 0 for status in movie_status.keys()}
+        results = {"created": 0, "updated": 0, "unchanged": 0, "resumed": 0}
+        synced = {}
+        for status, offset, interests in movie_stream:
+            fetched[status] += len(interests)
+            new_watermarks[status] = build_watermark(interests, new_watermarks.get(status))
+            checkpoint = journal.begin_page(status, offset, new_watermarks[status]) if journal else None
+            entries = parse_interests(interests)
+            del interests
+            # 一次性解析这一页里需要的所有日期关联，避免逐部电影重复查询年/月/周/日
+            notion_helper.prepare_dates(
+                utils.get_local_date(movie.date)
+                for movie in entries
+                if needs_date_relation(movie, movie_dict)
             )
+            for movie in entries:
+                synced[movie.url] = (movie.status, movie.date)
+                if journal and journal.is_written(movie.url):
+                    results["resumed"] += 1
+                    continue
+                results[sync_movie(movie, movie_dict, notion_helper, checkpoint)] += 1
+            if checkpoint:
+                checkpoint.close()
+    finally:
+        # 加载镜像或写入出错时停止后台抓取，否则抓取线程会一直阻塞在已满的队列上
+        movie_stream.close()
+
+    for status, count in fetched.items():
+        print(f"Fetched {count} movies with status '{movie_status[status]}'")
+
+    if notion_helper.plan:
+        # 计划模式只读取，不推进水位；镜像刷新只是把 Notion 的现状拉到本地，可以保留
+        mirror.close()
+        notion_helper.plan.print_summary()
+        return
+
+    outcomes = notion_helper.wait_writes()
+    journal.close()
+    print(
+        f"Inserted {results['created']}, updated {results['updated']}, unchanged {results['unchanged']}"
+        + (f", skipped {results['resumed']} written before the interruption" if results["resumed"] else "")
+    )
+
+    failed = [outcome for outcome in outcomes if not outcome["ok"]]
+    if any(notion_helper.is_page_missing(outcome) for outcome in failed):
+        # 镜像中的页面在 Notion 里已被删除或归档，下次运行全量重建镜像；
+        # 属性值不合法等普通的写入错误不会触发重建
+        mirror.mark_dirty()
+    notion_helper.forget_missing_relations(failed)
+    mirror.close()
+
+    if failed:
+        # 有写入失败时不推进水位，下次运行会重新拉取这些条目
+        print("Some Notion writes failed, keeping the previous sync watermark")
+        return results
+
+    save_watermarks(watermark_key, new_watermarks)
+    journal.clear()
+    refresh_heatmap(notion_helper, movie_dict, synced, publish=publish_heatmap)
+    return results
+
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="同步豆瓣电影到 Notion")
+    parser.add_argument("type", nargs="?", default="movie")
+    parser.add_argument("--full", action="store_true", help="忽略同步水位，全量拉取豆瓣数据")
+    parser.add_argument("--preload", action="store_true", help="启动时预加载分类、导演和日期数据库")
+    parser.add_argument("--rebuild-mirror", action="store_true", help="全量重建本地的 Notion 电影镜像")
+    parser.add_argument("--plan", action="store_true", help="只对比差异并列出将要执行的写入，不修改 Notion")
+    options = parser.parse_args(argv)
 
-def main():
-    notion_helper = NotionHelper("movie")
     douban_name = os.getenv("DOUBAN_NAME")
-    sync_movies(douban_name, notion_helper)
+    full = options.full or bool(os.getenv("FULL_SYNC"))
+    try:
+        with profiled():
+            notion_helper = NotionHelper(preload=options.preload, plan=options.plan)
+            try:
+                sync_movies(douban_name, notion_helper, full=full, rebuild_mirror=options.rebuild_mirror)
+            finally:
+                notion_helper.close()
+    finally:
+        write_report()
 
 
 if __name__ == "__main__":
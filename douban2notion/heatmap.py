@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from datetime import datetime
+
+from douban2notion import utils
+from douban2notion.state import get_state_path, load_state, update_state
+
+HEATMAP_STATE = "heatmap.json"
+HEATMAP_DATA_FILE = "heatmap_data.json"
+HEATMAP_RETENTION = int(os.getenv("HEATMAP_RETENTION", 3))
+OUT_FOLDER = "./OUT_FOLDER"
+WATCHED = "看过"
+
+
+def get_day(timestamp):
+    return utils.get_local_date(timestamp).date().isoformat()
+
+
+def count_watched_days(movie_dict, synced=None):
+    # 以本地镜像中的 Notion 现状为基础，叠加本次运行写入的状态和日期，统计每天看过的电影数
+    movies = {url: (movie.status, movie.date) for url, movie in movie_dict.items()}
+    movies.update(synced or {})
+    counts = {}
+    for status, timestamp in movies.values():
+        if status == WATCHED and timestamp:
+            day = get_day(timestamp)
+            counts[day] = counts.get(day, 0) + 1
+    return counts
+
+
+def get_heatmap_state(database_id):
+    # 按电影数据库分别保存，多个账号共用同一个状态目录时互不影响
+    return load_state(HEATMAP_STATE, {}).get("databases", {}).get(database_id)
+
+
+def get_changed_days(database_id, counts):
+    # 与上次发布时保存的统计比较，返回有变化的日期；没有变化时不需要重新渲染
+    state = get_heatmap_state(database_id)
+    if state is None:
+        return sorted(counts)
+    previous = state.get("counts", {})
+    return sorted(day for day in previous.keys() | counts.keys() if previous.get(day) != counts.get(day))
+
+
+def update_heatmap_state(database_id, update):
+    def apply(state):
+        update(state.setdefault("databases", {}).setdefault(database_id, {}))
+
+    return update_state(HEATMAP_STATE, apply, {})
+
+
+def save_heatmap_counts(database_id, counts):
+    update_heatmap_state(database_id, lambda state: state.update(counts=counts))
+
+
+def get_heatmap_filename(path):
+    # 按内容命名，内容不变时文件名和 Notion 中的链接都保持不变
+    with open(path, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    return f"{digest[:16]}.svg"
+
+
+def get_embedded_filename(heatmap_url):
+    if not heatmap_url:
+        return None
+    return heatmap_url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def record_published(database_id, filename):
+    # 返回所有数据库仍需保留的文件名，清理时不能删掉其他账号正在引用的热力图
+    def append(state):
+        published = [name for name in state.get("published", []) if name != filename]
+        state["published"] = (published + [filename])[-max(HEATMAP_RETENTION, 1):]
+
+    state = update_heatmap_state(database_id, append)
+    return {name for entry in state["databases"].values() for name in entry.get("published", [])}
+
+
+def prune_heatmaps(target_dir, keep):
+    # 只保留最近发布的 HEATMAP_RETENTION 个文件，其余未被引用的旧 SVG 删除
+    removed = 0
+    for name in os.listdir(target_dir):
+        if name.endswith(".svg") and name not in keep:
+            os.remove(os.path.join(target_dir, name))
+            removed += 1
+    if removed:
+        print(f"Pruned {removed} old heatmap files")
+    return removed
+
+
+def load_heatmap_counts(database_id):
+    return (get_heatmap_state(database_id) or {}).get("counts", {})
+
+
+def render_heatmap(counts):
+    # 使用 github_heatmap 的 json 数据源在本地渲染，不再通过 Notion API 重新读取日数据库
+    data_file = get_state_path(HEATMAP_DATA_FILE)
+    with open(data_file, "w", encoding="utf-8") as file:
+        json.dump(counts, file)
+
+    year = os.getenv("YEAR") or str(datetime.now(utils.get_timezone(utils.tz)).year)
+    command = [
+        sys.executable, "-m", "github_heatmap", "json",
+        "--json_file", data_file,
+        "--year", year,
+        "--me", os.getenv("MOVIE_NAME") or "",
+        "--unit", "部",
+        "--without-type-name",
+        "--background-color", os.getenv("BACKGROUND_COLOR") or "#FFFFFF",
+        "--track-color", os.getenv("TRACK_COLOR") or "#ACE7AE",
+        "--special-color1", os.getenv("SPECIAL_COLOR") or "#69C16E",
+        "--special-color2", os.getenv("SPECIAL_COLOR2") or "#549F57",
+        "--dom-color", os.getenv("DOM_COLOR") or "#EBEDF0",
+        "--text-color", os.getenv("TEXT_COLOR") or "#000000",
+    ]
+    subprocess.run(command, check=True)
+
+    output = os.path.join(OUT_FOLDER, "notion.svg")
+    shutil.move(os.path.join(OUT_FOLDER, "json.svg"), output)
+    return output
@@ -0,0 +1,157 @@
+import json
+import os
+import re
+import threading
+
+from douban2notion.state import get_state_path
+
+JOURNAL_FILE = "journal_{}.jsonl"
+
+
+class SyncJournal:
+    # 追加写入的检查点日志：先记录计划执行的操作，完成后再记录结果。
+    # 运行被取消或崩溃时日志保留下来，下次运行跳过已完成的豆瓣页面和写入；同步成功后清除
+    def __init__(self, key, path=None):
+        self.path = path or get_state_path(JOURNAL_FILE.format(re.sub(r"[^\w-]+", "_", key)))
+        self.lock = threading.Lock()
+        self.file = None
+        self.cleared = False
+        self.full = False
+        self.watermarks = {}
+        self.done_pages = {}
+        self.planned = set()
+        self.written = {}
+        self.pending = {}
+        self.closed_pages = set()
+        self.resumed = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        records = 0
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程被杀时最后一行可能只写了一半，之后的内容都不可信
+                    break
+                self.apply(record)
+                records += 1
+        return records > 0
+
+    def apply(self, record):
+        kind = record.get("type")
+        if kind == "run":
+            self.full = self.full or record.get("full", False)
+        elif kind == "page":
+            self.watermarks[record["status"]] = record.get("watermark")
+        elif kind == "page_done":
+            self.done_pages.setdefault(record["status"], set()).add(record["offset"])
+        elif kind == "plan":
+            self.planned.add(record["url"])
+        elif kind == "done":
+            self.written[record["url"]] = record.get("page_id")
+
+    def append(self, record):
+        with self.lock:
+            if self.cleared:
+                # 同步成功、日志已清除后不再写入，否则会重新创建日志，下次运行误以为需要续传
+                return
+            if self.file is None:
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.apply(record)
+
+    def start(self, full):
+        self.append({"type": "run", "full": full})
+
+    def get_start_offset(self, status, page_size):
+        # 从第一个没有完成的页面开始；页面之间可能乱序完成，只取从 0 开始连续完成的部分
+        done = self.done_pages.get(status, set())
+        offset = 0
+        while offset in done:
+            offset += page_size
+        # 中断期间豆瓣上删除的条目会让后面的条目前移，多退一页，已完成的条目会按链接跳过
+        return max(offset - page_size, 0)
+
+    def get_start_offsets(self, statuses, page_size):
+        return {status: self.get_start_offset(status, page_size) for status in statuses}
+
+    def is_written(self, url):
+        return url in self.written
+
+    def get_unconfirmed_creates(self):
+        # 记录了计划创建但没有记录完成的链接，可能在 create_page 返回后、写日志前被中断
+        return sorted(self.planned - self.written.keys())
+
+    def record_found(self, url, page_id):
+        self.append({"type": "done", "op": "create", "url": url, "page_id": page_id})
+
+    def begin_page(self, status, offset, watermark):
+        self.append({"type": "page", "status": status, "offset": offset, "watermark": watermark})
+        with self.lock:
+            self.pending[(status, offset)] = 0
+        return JournalPage(self, status, offset)
+
+    def record_plan(self, status, offset, op, url):
+        with self.lock:
+            self.pending[(status, offset)] += 1
+        if op == "create":
+            self.append({"type": "plan", "op": op, "url": url})
+
+    def record_done(self, status, offset, op, url, result):
+        # 写入失败时不减少计数，这一页不会被标记为完成
+        if not result:
+            return
+        self.append({"type": "done", "op": op, "url": url, "page_id": result.get("id")})
+        with self.lock:
+            self.pending[(status, offset)] -= 1
+        self.finish_page(status, offset)
+
+    def close_page(self, status, offset):
+        with self.lock:
+            self.closed_pages.add((status, offset))
+        self.finish_page(status, offset)
+
+    def finish_page(self, status, offset):
+        # 页面内所有条目都已对比、所有写入都已成功时才算完成
+        with self.lock:
+            key = (status, offset)
+            if key not in self.closed_pages or self.pending.get(key) != 0:
+                return
+            self.pending.pop(key)
+        self.append({"type": "page_done", "status": status, "offset": offset})
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def clear(self):
+        with self.lock:
+            self.cleared = True
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class JournalPage:
+    # 一个豆瓣页面的检查点，sync_movie 在提交写入前后通过它记录计划和结果
+    def __init__(self, journal, status, offset):
+        self.journal = journal
+        self.status = status
+        self.offset = offset
+
+    def plan(self, op, url):
+        self.journal.record_plan(self.status, self.offset, op, url)
+
+    def done(self, op, url):
+        # 返回写入成功后的回调，由写入线程在 future 完成之前调用
+        return lambda result: self.journal.record_done(self.status, self.offset, op, url, result)
+
+    def close(self):
+        self.journal.close_page(self.status, self.offset)
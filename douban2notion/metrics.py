@@ -0,0 +1,281 @@
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from importlib.util import find_spec
+
+from douban2notion.state import get_state_path
+
+METRICS_FILE = "metrics.json"
+# 延迟直方图的桶上界（毫秒）
+LATENCY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+current_endpoint = contextvars.ContextVar("current_endpoint", default=None)
+
+
+def get_endpoint_name(fn):
+    # notion-client 的方法挂在 DatabasesEndpoint、BlocksChildrenEndpoint 等对象上，还原为 databases.query 这样的名字
+    owner = getattr(fn, "__self__", None)
+    if owner is None:
+        return getattr(fn, "__name__", repr(fn))
+    words = re.findall(r"[A-Z][a-z]*", type(owner).__name__.replace("Endpoint", ""))
+    return ".".join([word.lower() for word in words] + [fn.__name__])
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttled = 0
+        self.throttle_wait = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, elapsed):
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        millis = elapsed * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if millis <= bound:
+                self.histogram[i] += 1
+                return
+
+    def percentile(self, q):
+        # 直方图只保留桶计数，分位数取所在桶的上界（不超过实际最大值）
+        total = sum(self.histogram)
+        if not total:
+            return None
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.histogram):
+            seen += count
+            if seen >= q * total:
+                return round(min(bound, self.max_time * 1000))
+        return None
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "throttle_wait": round(self.throttle_wait, 3),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "total_time": round(self.total_time, 3),
+            "max_ms": round(self.max_time * 1000),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "histogram": {
+                ("inf" if bound == float("inf") else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS, self.histogram)
+            },
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.endpoints = {}
+            self.spans = {}
+            self.caches = {}
+
+    def endpoint(self, name):
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints.setdefault(name, EndpointStats())
+        return stats
+
+    def record_call(self, name, elapsed, ok=True):
+        with self.lock:
+            stats = self.endpoint(name)
+            stats.calls += 1
+            stats.errors += 0 if ok else 1
+            stats.observe(elapsed)
+
+    def record_retry(self, name, throttled=False):
+        with self.lock:
+            stats = self.endpoint(name)
+            stats.retries += 1
+            stats.throttled += 1 if throttled else 0
+
+    def record_throttle_wait(self, name, waited):
+        if waited <= 0:
+            return
+        with self.lock:
+            self.endpoint(name).throttle_wait += waited
+
+    def record_bytes(self, name, sent=0, received=0):
+        with self.lock:
+            stats = self.endpoint(name)
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+
+    def record_cache(self, name, result):
+        with self.lock:
+            counts = self.caches.setdefault(name, {})
+            counts[result] = counts.get(result, 0) + 1
+
+    def record_span(self, name, elapsed):
+        with self.lock:
+            span = self.spans.setdefault(name, {"calls": 0, "total_time": 0.0})
+            span["calls"] += 1
+            span["total_time"] += elapsed
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(name, time.perf_counter() - start)
+
+    def traced(self, name):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timed(name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def report(self):
+        with self.lock:
+            caches = {}
+            for name, counts in self.caches.items():
+                total = sum(counts.values())
+                hits = total - counts.get("miss", 0)
+                caches[name] = dict(counts, total=total, hit_rate=round(hits / total, 3) if total else None)
+            return {
+                "started_at": self.started,
+                "duration": round(time.time() - self.started, 3),
+                "endpoints": {name: stats.to_dict() for name, stats in sorted(self.endpoints.items())},
+                "spans": {
+                    name: {"calls": span["calls"], "total_time": round(span["total_time"], 3)}
+                    for name, span in sorted(self.spans.items())
+                },
+                "caches": caches,
+            }
+
+
+metrics = Metrics()
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def render_markdown(report):
+    lines = [
+        "### 同步统计",
+        "",
+        f"总耗时 {report['duration']}s",
+        "",
+        "| 接口 | 调用 | 失败 | 重试 | 429 | 限速等待(s) | p50(ms) | p95(ms) | 最大(ms) | 发送 | 接收 |",
+        "| --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: |",
+    ]
+    for name, stats in report["endpoints"].items():
+        lines.append(
+            f"| {name} | {stats['calls']} | {stats['errors']} | {stats['retries']} | {stats['throttled']} "
+            f"| {stats['throttle_wait']} | {stats['p50_ms']} | {stats['p95_ms']} | {stats['max_ms']} "
+            f"| {format_bytes(stats['bytes_sent'])} | {format_bytes(stats['bytes_received'])} |"
+        )
+    if report["caches"]:
+        lines += ["", "| 缓存 | 命中率 | 明细 |", "| --- | ---: | --- |"]
+        for name, counts in report["caches"].items():
+            detail = ", ".join(
+                f"{key}={value}" for key, value in counts.items() if key not in ("total", "hit_rate")
+            )
+            hit_rate = "-" if counts["hit_rate"] is None else f"{counts['hit_rate']:.1%}"
+            lines.append(f"| {name} | {hit_rate} | {detail} |")
+    if report["spans"]:
+        lines += ["", "| 阶段 | 次数 | 耗时(s) |", "| --- | ---: | ---: |"]
+        for name, span in report["spans"].items():
+            lines.append(f"| {name} | {span['calls']} | {span['total_time']} |")
+    return "\n".join(lines) + "\n"
+
+
+def write_report():
+    # JSON 报告写入 METRICS_FILE（默认在状态目录下），在 GitHub Actions 中同时追加到步骤摘要
+    report = metrics.report()
+    path = os.getenv("METRICS_FILE") or get_state_path(METRICS_FILE)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Metrics report written to {path}")
+
+    summary = os.getenv("GITHUB_STEP_SUMMARY")
+    if summary:
+        with open(summary, "a", encoding="utf-8") as file:
+            file.write(render_markdown(report))
+    return report
+
+
+def record_httpx_request(request):
+    name = current_endpoint.get()
+    if name:
+        metrics.record_bytes(name, sent=len(request.content))
+
+
+def record_httpx_response(response):
+    name = current_endpoint.get()
+    if name:
+        response.read()
+        metrics.record_bytes(name, received=len(response.content))
+
+
+def get_httpx_event_hooks():
+    return {"request": [record_httpx_request], "response": [record_httpx_response]}
+
+
+@contextmanager
+def profiled():
+    # PROFILE=cprofile 或 PROFILE=pyinstrument 时对整个运行过程采样，结果写入 PROFILE_OUTPUT
+    mode = (os.getenv("PROFILE") or "").lower()
+    if mode == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.getenv("PROFILE_OUTPUT") or get_state_path("profile.prof")
+            profiler.dump_stats(path)
+            print(f"cProfile stats written to {path}")
+    elif mode == "pyinstrument" and find_spec("pyinstrument") is None:
+        print("PROFILE=pyinstrument requires `pip install pyinstrument`, profiling disabled")
+        yield
+    elif mode == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = os.getenv("PROFILE_OUTPUT") or get_state_path("profile.html")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(profiler.output_html())
+            print(f"pyinstrument report written to {path}")
+    else:
+        yield
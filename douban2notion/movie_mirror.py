@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from douban2notion.state import get_state_path
+from douban2notion.config import movie_properties_type_dict
+from douban2notion.records import ExistingMovie
+from douban2notion.utils import get_codec
+
+MIRROR_FILE = "movie_mirror_{}.sqlite"
+SCHEMA_VERSION = "1"
+# Notion 的 last_edited_time 只精确到分钟，增量拉取时向前多取一段
+EDIT_TIME_MARGIN = timedelta(minutes=5)
+
+
+movie_codec = get_codec(movie_properties_type_dict)
+
+
+def decode_movie_page(page):
+    properties = page.get("properties")
+    decode = movie_codec.decode
+    return decode(properties, "豆瓣链接"), ExistingMovie(
+        page_id=page.get("id"),
+        comment=decode(properties, "短评"),
+        status=decode(properties, "状态"),
+        date=decode(properties, "日期"),
+        rating=decode(properties, "评分"),
+        categories=decode(properties, "分类"),
+    )
+
+
+class MovieMirror:
+    def __init__(self, database_id, path=None, max_age_days=None):
+        self.database_id = database_id
+        # 每个电影数据库单独一个文件，多个账号共用状态目录时不会互相触发重建
+        self.path = path or get_state_path(MIRROR_FILE.format(database_id.replace("-", "")))
+        if max_age_days is None:
+            max_age_days = float(os.getenv("MIRROR_MAX_AGE_DAYS", 7))
+        self.max_age = max_age_days * 24 * 3600
+        self.refresh_started = None
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS movie ("
+            "url TEXT PRIMARY KEY, page_id TEXT NOT NULL, comment TEXT, status TEXT, "
+            "date INTEGER, rating TEXT, categories TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS movie_page_id ON movie (page_id)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def needs_rebuild(self):
+        if self.get_meta("schema_version") != SCHEMA_VERSION:
+            return True
+        if self.get_meta("database_id") != self.database_id or self.get_meta("dirty") == "1":
+            return True
+        rebuilt_at = self.get_meta("rebuilt_at")
+        return not rebuilt_at or time.time() - float(rebuilt_at) > self.max_age
+
+    def begin_refresh(self, rebuild=False):
+        # 返回本次需要使用的 databases.query 过滤条件，全量重建时返回 None
+        self.refresh_started = datetime.now(timezone.utc)
+        synced_at = self.get_meta("synced_at")
+        if rebuild or not synced_at or self.needs_rebuild():
+            print("Rebuilding local Notion movie mirror")
+            self.conn.execute("DELETE FROM movie")
+            self.set_meta("rebuilt_at", str(time.time()))
+            return None
+        since = datetime.fromisoformat(synced_at) - EDIT_TIME_MARGIN
+        return {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since.isoformat()}}
+
+    def apply(self, pages):
+        rows = []
+        for page in pages:
+            url, movie = decode_movie_page(page)
+            if not url:
+                continue
+            # 豆瓣链接被修改过的页面，先删掉旧链接对应的记录
+            self.conn.execute("DELETE FROM movie WHERE page_id = ?", (movie.page_id,))
+            rows.append((
+                url,
+                movie.page_id,
+                movie.comment,
+                movie.status,
+                movie.date,
+                movie.rating,
+                json.dumps(movie.categories),
+            ))
+        self.conn.executemany("INSERT OR REPLACE INTO movie VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def finish_refresh(self):
+        self.set_meta("synced_at", self.refresh_started.isoformat())
+        self.set_meta("database_id", self.database_id)
+        self.set_meta("schema_version", SCHEMA_VERSION)
+        self.set_meta("dirty", "0")
+        self.conn.commit()
+
+    def mark_dirty(self):
+        self.set_meta("dirty", "1")
+        self.conn.commit()
+
+    def load(self):
+        return {
+            url: ExistingMovie(page_id, comment, status, date, rating, json.loads(categories or "[]"))
+            for url, page_id, comment, status, date, rating, categories in self.conn.execute(
+                "SELECT url, page_id, comment, status, date, rating, categories FROM movie"
+            )
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import re
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from douban2notion.douban import sync_movies
+from douban2notion.metrics import get_httpx_event_hooks, profiled, write_report
+from douban2notion.notion_helper import NotionHelper
+from douban2notion.ratelimit import get_host_limiter
+from douban2notion.relation_cache import RelationCache
+
+MULTI_CONCURRENCY = int(os.getenv("MULTI_CONCURRENCY", 4))
+UNEXPANDED_VAR = re.compile(r"\$(\w+|\{[^}]*\})")
+
+
+def load_accounts(path):
+    # 配置文件是一个 JSON 数组，每项包含 douban_name、notion_token 和 notion_page；
+    # 值中的 $VAR 会用环境变量展开，token 可以放在 GitHub Secrets 里而不写进文件
+    with open(path, encoding="utf-8") as file:
+        entries = json.load(file)
+    accounts = []
+    for index, entry in enumerate(entries):
+        account = {key: os.path.expandvars(value) if isinstance(value, str) else value for key, value in entry.items()}
+        # expandvars 遇到未设置的变量会原样保留 "$VAR"，不能把它当成 token 或页面地址去请求
+        for key, value in account.items():
+            unexpanded = UNEXPANDED_VAR.search(value) if isinstance(value, str) else None
+            if unexpanded:
+                raise ValueError(
+                    f"Account #{index + 1} in {path}: {key} uses {unexpanded.group(0)}, which is not set in the environment"
+                )
+        missing = [key for key in ("douban_name", "notion_token", "notion_page") if not account.get(key)]
+        if missing:
+            raise ValueError(f"Account #{index + 1} in {path} is missing {', '.join(missing)}")
+        account.setdefault("name", account["douban_name"])
+        accounts.append(account)
+    return accounts
+
+
+class SharedResources:
+    # 同一个 token 的账号共用一个 Notion 连接池和限速器（Notion 按 integration token 限速），
+    # 所有账号共用豆瓣连接池（transport 模块级单例）和按数据库 id 区分的关联缓存
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.relation_cache = RelationCache()
+        self.rate = float(os.getenv("NOTION_RATE_LIMIT", 3))
+
+    def get_http_client(self, notion_token):
+        with self.lock:
+            if notion_token not in self.clients:
+                self.clients[notion_token] = httpx.Client(event_hooks=get_httpx_event_hooks())
+            return self.clients[notion_token]
+
+    def get_limiter(self, notion_token):
+        return get_host_limiter(f"notion:{notion_token}", self.rate)
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+        self.relation_cache.close()
+
+
+def run_account(account, shared, options):
+    print(f"[{account['name']}] Syncing {account['douban_name']} into {account['notion_page']}")
+    notion_helper = NotionHelper(
+        preload=options.preload,
+        plan=options.plan,
+        notion_token=account["notion_token"],
+        page_url=account["notion_page"],
+        http_client=shared.get_http_client(account["notion_token"]),
+        limiter=shared.get_limiter(account["notion_token"]),
+        relation_cache=shared.relation_cache,
+    )
+    try:
+        sync_movies(
+            account["douban_name"],
+            notion_helper,
+            full=options.full,
+            rebuild_mirror=options.rebuild_mirror,
+            watermark_key=f"{account['douban_name']}:{notion_helper.page_id}",
+        )
+    finally:
+        notion_helper.close()
+
+
+def run_accounts(accounts, options):
+    shared = SharedResources()
+    failed = []
+
+    def run(account):
+        try:
+            run_account(account, shared, options)
+        except Exception:
+            print(f"[{account['name']}] Sync failed:\n{traceback.format_exc()}")
+            failed.append(account["name"])
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(MULTI_CONCURRENCY, len(accounts)))) as executor:
+            list(executor.map(run, accounts))
+    finally:
+        shared.close()
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按配置文件同时同步多个豆瓣账号")
+    parser.add_argument("config", nargs="?", default=os.getenv("ACCOUNTS_FILE", "accounts.json"))
+    parser.add_argument("--full", action="store_true", help="忽略同步水位，全量拉取豆瓣数据")
+    parser.add_argument("--preload", action="store_true", help="启动时预加载分类、导演和日期数据库")
+    parser.add_argument("--rebuild-mirror", action="store_true", help="全量重建本地的 Notion 电影镜像")
+    parser.add_argument("--plan", action="store_true", help="只对比差异并列出将要执行的写入，不修改 Notion")
+    options = parser.parse_args(argv)
+    options.full = options.full or bool(os.getenv("FULL_SYNC"))
+
+    accounts = load_accounts(options.config)
+    try:
+        with profiled():
+            failed = run_accounts(accounts, options)
+    finally:
+        write_report()
+    print(f"Synced {len(accounts) - len(failed)} of {len(accounts)} accounts")
+    if failed:
+        raise SystemExit(f"Failed accounts: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,48 @@
 import logging
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
-from notion_client import Client
-from retrying import retry
+import httpx
+from notion_client import APIResponseError, Client
+
+from douban2notion.calendar_dimension import CalendarDimension
+from douban2notion.metrics import get_httpx_event_hooks, metrics
+from douban2notion.notion_writer import WriteExecutor, call_with_backoff
+from douban2notion.plan import SyncPlan, is_placeholder
+from douban2notion.ratelimit import TokenBucket
+from douban2notion.relation_cache import RelationCache
+from douban2notion.state import load_state, update_state
 
 from douban2notion.utils import (
-    format_date,
-    get_date,
-    get_first_and_last_day_of_month,
-    get_first_and_last_day_of_week,
-    get_first_and_last_day_of_year,
+    get_day_bucket,
     get_icon,
-    get_relation,
+    get_month_bucket,
+    get_property_value,
     get_title,
+    get_week_bucket,
+    get_year_bucket,
 )
 
 TAG_ICON_URL = "https://www.notion.so/icons/tag_gray.svg"
 USER_ICON_URL = "https://www.notion.so/icons/user-circle-filled_gray.svg"
-TARGET_ICON_URL = "https://www.notion.so/icons/target_red.svg"
 BOOKMARK_ICON_URL = "https://www.notion.so/icons/bookmark_gray.svg"
+HEATMAP_URL_PREFIX = "https://heatmap.malinkang.com/"
+DISCOVERY_STATE = "discovery.json"
+DISCOVERY_CONCURRENCY = int(os.getenv("DISCOVERY_CONCURRENCY", 3))
+# validation_error 也会由属性值不合法、文本过长等引起，只有 object_not_found 能直接说明页面不存在
+RELATION_FAILURE_CODES = ("object_not_found", "validation_error")
+
+
+def is_missing(error):
+    return error.code == "object_not_found"
+
 
+def is_live(obj):
+    return not obj.get("archived") and not obj.get("in_trash")
 
-class NotionHelper:
+
+class NotionBase:
     database_name_dict = {
         "MOVIE_DATABASE_NAME": "电影",
         "DAY_DATABASE_NAME": "日",
@@ -32,22 +52,55 @@ class NotionHelper:
         "CATEGORY_DATABASE_NAME": "分类",
         "DIRECTOR_DATABASE_NAME": "导演",
     }
-    database_id_dict = {}
     image_dict = {}
 
-    def __init__(self):
-        notion_token = os.getenv("NOTION_TOKEN") or os.getenv("MOVIE_NOTION_TOKEN")
-        page_url = os.getenv("NOTION_MOVIE_URL")
+    def __init__(self, notion_token=None, page_url=None, relation_cache=None):
+        self.notion_token = notion_token or os.getenv("NOTION_TOKEN") or os.getenv("MOVIE_NOTION_TOKEN")
+        self.client_options = {"auth": self.notion_token, "log_level": logging.ERROR}
+        if os.getenv("NOTION_BASE_URL"):
+            self.client_options["base_url"] = os.getenv("NOTION_BASE_URL")
+        self.page_id = self.extract_page_id(page_url or os.getenv("NOTION_MOVIE_URL"))
+        self.database_name_dict = {
+            key: os.getenv(key) or name for key, name in self.database_name_dict.items()
+        }
+        self.database_id_dict = {}
+        self.heatmap_block_id = None
+        self.heatmap_url = None
+        # 关联状态：内存中已解析的 id、预加载索引、id 到名字的反查表和持久缓存
+        self.relation_ids = {}
+        self.relation_index = {}
+        self.relation_titles = {}
+        self.owns_relation_cache = relation_cache is None
+        self.relation_cache = relation_cache or RelationCache()
 
-        self.client = Client(auth=notion_token, log_level=logging.ERROR)
-        self.__cache = {}
-        self.page_id = self.extract_page_id(page_url)
-        self.search_database(self.page_id)
+    def discovery_complete(self):
+        return (
+            set(self.database_name_dict.values()) <= self.database_id_dict.keys()
+            and self.heatmap_block_id is not None
+        )
 
-        for key in self.database_name_dict.keys():
-            if os.getenv(key):
-                self.database_name_dict[key] = os.getenv(key)
+    def load_discovery(self):
+        if os.getenv("REFRESH_DISCOVERY"):
+            return None
+        cached = load_state(DISCOVERY_STATE, {}).get(self.page_id)
+        if not cached or not set(self.database_name_dict.values()) <= cached["database_id_dict"].keys():
+            return None
+        return cached
 
+    def apply_discovery(self, cached):
+        self.database_id_dict = dict(cached["database_id_dict"])
+        self.heatmap_block_id = cached.get("heatmap_block_id")
+        self.heatmap_url = cached.get("heatmap_url")
+
+    def save_discovery(self):
+        discovery = {
+            "database_id_dict": self.database_id_dict,
+            "heatmap_block_id": self.heatmap_block_id,
+            "heatmap_url": self.heatmap_url,
+        }
+        update_state(DISCOVERY_STATE, lambda cache: cache.update({self.page_id: discovery}), {})
+
+    def resolve_database_ids(self):
         self.movie_database_id = self.database_id_dict.get(
             self.database_name_dict.get("MOVIE_DATABASE_NAME")
         )
@@ -73,13 +126,89 @@ class NotionHelper:
         if self.day_database_id:
             self.write_database_id(self.day_database_id)
 
+    def record_child(self, child):
+        if child["type"] == "child_database":
+            self.database_id_dict[
+                child.get("child_database").get("title")
+            ] = child.get("id")
+        elif child["type"] == "embed" and child.get("embed").get("url"):
+            if child.get("embed").get("url").startswith(HEATMAP_URL_PREFIX):
+                self.heatmap_block_id = child.get("id")
+                self.heatmap_url = child.get("embed").get("url")
+
     def write_database_id(self, database_id):
         env_file = os.getenv('GITHUB_ENV')
+        if not env_file:
+            return
         with open(env_file, "a") as file:
             file.write(f"DATABASE_ID={database_id}\n")
         print(f"Written DATABASE_ID: {database_id}")  # 添加调试信息
 
 
+    def get_date_buckets(self, date):
+        day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        return {
+            "年": (self.year_database_id, get_year_bucket(day)),
+            "月": (self.month_database_id, get_month_bucket(day)),
+            "周": (self.week_database_id, get_week_bucket(day)),
+            "日": (self.day_database_id, get_day_bucket(day)),
+        }
+
+    def find_relation(self, name, database_id):
+        # 依次查内存、预加载索引和持久缓存，返回 (page_id, 是否需要向 Notion 确认)，都没有时返回 None；
+        # 只有确认和查询、创建需要请求 Notion，由 NotionHelper 完成
+        page_id = self.relation_ids.get(f"{database_id}{name}")
+        if page_id:
+            metrics.record_cache("relation", "memory")
+            return page_id, False
+
+        index = self.relation_index.get(database_id)
+        if index is not None:
+            # 已预加载的数据库索引是完整的，未命中即可直接创建，无需再查询
+            if name not in index:
+                return None
+            metrics.record_cache("relation", "preload")
+            self.remember_relation(database_id, name, index[name])
+            return index[name], False
+
+        cached = self.relation_cache.get(database_id, name)
+        if cached and not cached[1]:
+            metrics.record_cache("relation", "persistent")
+            self.remember_relation(database_id, name, cached[0])
+        return cached
+
+    def confirm_relation(self, name, database_id, page_id, alive):
+        if not alive:
+            self.relation_cache.invalidate(database_id, name)
+            return
+        self.relation_cache.put(database_id, name, page_id)
+        metrics.record_cache("relation", "persistent")
+        self.remember_relation(database_id, name, page_id)
+
+    def get_relation_filter(self, name):
+        return {"property": "标题", "title": {"equals": name}}
+
+    def get_relation_page(self, name, database_id, icon, properties):
+        properties["标题"] = get_title(name)
+        return {
+            "parent": {"database_id": database_id, "type": "database_id"},
+            "properties": properties,
+            "icon": get_icon(icon),
+        }
+
+    def store_relation(self, name, database_id, page_id):
+        self.remember_relation(database_id, name, page_id)
+        index = self.relation_index.get(database_id)
+        if index is not None:
+            index[name] = page_id
+        if not is_placeholder(page_id):
+            self.relation_cache.put(database_id, name, page_id)
+
+    def remember_relation(self, database_id, name, page_id):
+        self.relation_ids[f"{database_id}{name}"] = page_id
+        if database_id in self.relation_titles:
+            self.relation_titles[database_id][page_id.replace("-", "")] = name
+
     def extract_page_id(self, notion_url):
         match = re.search(
             r"([a-f0-9]{32}|[a-f0-9]{8}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{4}-[a-f0-9]{12})",
@@ -90,105 +219,290 @@ class NotionHelper:
         else:
             raise Exception(f"获取NotionID失败，请检查输入的Url是否正确")
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+
+class NotionHelper(NotionBase):
+    def __init__(
+        self,
+        preload=False,
+        plan=False,
+        notion_token=None,
+        page_url=None,
+        http_client=None,
+        limiter=None,
+        relation_cache=None,
+    ):
+        # 多账号运行时由调用方传入按 token 共享的连接池、限速器和关联缓存，单账号时各自创建
+        super().__init__(notion_token, page_url, relation_cache)
+        self.plan = SyncPlan() if plan else None
+        self.client = Client(
+            client=http_client or httpx.Client(event_hooks=get_httpx_event_hooks()), **self.client_options
+        )
+        self.limiter = limiter or TokenBucket(float(os.getenv("NOTION_RATE_LIMIT", 3)))
+        self.max_attempts = int(os.getenv("NOTION_MAX_ATTEMPTS", 8))
+        self.writer = WriteExecutor(self.limiter, max_attempts=self.max_attempts)
+        self.calendar = CalendarDimension(self)
+        self.discover_databases()
+        self.resolve_database_ids()
+
+        if preload or os.getenv("PRELOAD_RELATIONS"):
+            self.preload_relations()
+
+    @metrics.traced("preload_relations")
+    def preload_relations(self):
+        database_ids = [
+            database_id
+            for database_id in (
+                self.category_database_id,
+                self.director_database_id,
+                self.day_database_id,
+                self.week_database_id,
+                self.month_database_id,
+                self.year_database_id,
+            )
+            if database_id
+        ]
+        if not database_ids:
+            return
+        with ThreadPoolExecutor(max_workers=len(database_ids)) as executor:
+            # 标题属性的 property id 固定为 "title"，只取这一列
+            pages_list = list(
+                executor.map(
+                    lambda database_id: self.query_all(database_id, filter_properties=["title"]),
+                    database_ids,
+                )
+            )
+        for database_id, pages in zip(database_ids, pages_list):
+            index = {}
+            for page in pages:
+                title = get_property_value(page.get("properties", {}).get("标题"))
+                if title and title not in index:
+                    index[title] = page.get("id")
+            self.relation_index[database_id] = index
+            print(f"Preloaded {len(index)} relations from {database_id}")
+
+    @metrics.traced("discover_databases")
+    def discover_databases(self):
+        cached = self.load_discovery()
+        if cached and self.is_database_alive(
+            cached["database_id_dict"].get(self.database_name_dict["MOVIE_DATABASE_NAME"])
+        ):
+            self.apply_discovery(cached)
+            return
+        self.search_database(self.page_id)
+        self.save_discovery()
+
+    def is_database_alive(self, database_id):
+        try:
+            return is_live(self.request(self.client.databases.retrieve, database_id=database_id))
+        except APIResponseError as e:
+            if is_missing(e):
+                return False
+            raise
+
+    def list_children(self, block_id):
+        children = []
+        kwargs = {"block_id": block_id, "page_size": 100}
+        while True:
+            response = self.request(self.client.blocks.children.list, **kwargs)
+            children.extend(response["results"])
+            if not response.get("has_more"):
+                return children
+            kwargs["start_cursor"] = response.get("next_cursor")
+
     def search_database(self, block_id):
-        children = self.client.blocks.children.list(block_id=block_id)["results"]
-        for child in children:
-            if child["type"] == "child_database":
-                self.database_id_dict[
-                    child.get("child_database").get("title")
-                ] = child.get("id")
-            elif child["type"] == "embed" and child.get("embed").get("url"):
-                if child.get("embed").get("url").startswith("https://heatmap.malinkang.com/"):
-                    self.heatmap_block_id = child.get("id")
-            if "has_children" in child and child["has_children"]:
-                self.search_database(child["id"])
-
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+        # 广度优先遍历，同一层的块并发读取；配置的数据库和热力图都找到后提前结束
+        frontier = [block_id]
+        with ThreadPoolExecutor(max_workers=DISCOVERY_CONCURRENCY) as executor:
+            while frontier and not self.discovery_complete():
+                next_frontier = []
+                for children in executor.map(self.list_children, frontier):
+                    for child in children:
+                        self.record_child(child)
+                        if child.get("has_children"):
+                            next_frontier.append(child["id"])
+                frontier = next_frontier
+
     def update_heatmap(self, block_id, url):
-        return self.client.blocks.update(block_id=block_id, embed={"url": url})
-
-    def get_week_relation_id(self, date):
-        year = date.isocalendar().year
-        week = date.isocalendar().week
-        week_name = f"{year}年第{week}周"
-        start, end = get_first_and_last_day_of_week(date)
-        properties = {"日期": get_date(format_date(start), format_date(end))}
-        return self.get_relation_id(week_name, self.week_database_id, TARGET_ICON_URL, properties)
-
-    def get_month_relation_id(self, date):
-        month_name = date.strftime("%Y年%-m月")
-        start, end = get_first_and_last_day_of_month(date)
-        properties = {"日期": get_date(format_date(start), format_date(end))}
-        return self.get_relation_id(month_name, self.month_database_id, TARGET_ICON_URL, properties)
-
-    def get_year_relation_id(self, date):
-        year_name = date.strftime("%Y")
-        start, end = get_first_and_last_day_of_year(date)
-        properties = {"日期": get_date(format_date(start), format_date(end))}
-        return self.get_relation_id(year_name, self.year_database_id, TARGET_ICON_URL, properties)
-
-    def get_day_relation_id(self, date):
-        new_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_name = new_date.strftime("%Y年%m月%d日")
-        properties = {"日期": get_date(format_date(date))}
-        properties["年"] = get_relation([self.get_year_relation_id(new_date)])
-        properties["月"] = get_relation([self.get_month_relation_id(new_date)])
-        properties["周"] = get_relation([self.get_week_relation_id(new_date)])
-        return self.get_relation_id(day_name, self.day_database_id, TARGET_ICON_URL, properties)
-
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+        return self.request(self.client.blocks.update, block_id=block_id, embed={"url": url})
+
+    def request(self, fn, recover=None, **kwargs):
+        return call_with_backoff(self.limiter, self.max_attempts, fn, recover=recover, **kwargs)[0]
+
     def get_relation_id(self, name, database_id, icon, properties={}):
-        key = f"{database_id}{name}"
-        if key in self.__cache:
-            return self.__cache[key]
-        
-        filter = {"property": "标题", "title": {"equals": name}}
-        response = self.client.databases.query(database_id=database_id, filter=filter)
-        
-        if not response.get("results"):
-            parent = {"database_id": database_id, "type": "database_id"}
-            properties["标题"] = get_title(name)
-            page_id = self.client.pages.create(parent=parent, properties=properties, icon=get_icon(icon)).get("id")
-        else:
-            page_id = response.get("results")[0].get("id")
+        found = self.find_relation(name, database_id)
+        if found:
+            page_id, needs_validation = found
+            if not needs_validation:
+                return page_id
+            alive = self.is_page_alive(page_id)
+            self.confirm_relation(name, database_id, page_id, alive)
+            if alive:
+                return page_id
 
-        self.__cache[key] = page_id
+        metrics.record_cache("relation", "miss")
+        page_id = None
+        if database_id not in self.relation_index:
+            response = self.request(
+                self.client.databases.query, database_id=database_id, filter=self.get_relation_filter(name)
+            )
+            if response.get("results"):
+                page_id = response.get("results")[0].get("id")
+        page_id = page_id or self.create_relation_page(name, database_id, icon, properties)
+        self.store_relation(name, database_id, page_id)
         return page_id
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+    def get_relation_names(self, database_id, relations):
+        # 把已有页面上的关联 id 还原为名字；有任何一个未知时返回 None，由调用方回退到按 id 比较
+        if database_id not in self.relation_titles:
+            titles = self.relation_cache.titles(database_id)
+            for title, page_id in self.relation_index.get(database_id, {}).items():
+                titles[page_id.replace("-", "")] = title
+            self.relation_titles[database_id] = titles
+        titles = self.relation_titles[database_id]
+        names = []
+        for relation in relations or []:
+            page_id = relation.get("id") if isinstance(relation, dict) else relation
+            name = titles.get(page_id.replace("-", ""))
+            if name is None:
+                return None
+            names.append(name)
+        return names
+
+    def get_database_name(self, database_id):
+        return next(
+            (name for name, value in self.database_id_dict.items() if value == database_id), database_id
+        )
+
+    def create_relation_page(self, name, database_id, icon, properties):
+        if self.plan:
+            return self.plan.add_relation(self.get_database_name(database_id), name)
+        return self.request(
+            self.client.pages.create,
+            recover=lambda: self.find_page(database_id, self.get_relation_filter(name)),
+            **self.get_relation_page(name, database_id, icon, properties),
+        ).get("id")
+
+    def is_page_alive(self, page_id):
+        try:
+            return is_live(self.request(self.client.pages.retrieve, page_id=page_id))
+        except APIResponseError as e:
+            if is_missing(e):
+                return False
+            raise
+
+    def is_page_missing(self, outcome):
+        # 更新已归档的页面同样返回 validation_error，向 Notion 确认页面已归档或删除后才算页面不存在
+        if outcome["code"] == "object_not_found":
+            return True
+        return (
+            outcome["code"] == "validation_error"
+            and bool(outcome.get("page_id"))
+            and not self.is_page_alive(outcome["page_id"])
+        )
+
+    def forget_missing_relations(self, outcomes):
+        # 关联页面在持久缓存中最长 RELATION_CACHE_TTL 才复查一次；写入因页面不存在而失败时，
+        # 立即确认这次写入引用的关联页面，已删除或归档的从各级缓存中移除，下次按标题重新查找或创建
+        page_ids = {
+            page_id
+            for outcome in outcomes
+            if not outcome["ok"] and outcome.get("code") in RELATION_FAILURE_CODES
+            for page_id in outcome.get("relations", [])
+            if not is_placeholder(page_id)
+        }
+        missing = [page_id for page_id in page_ids if not self.is_page_alive(page_id)]
+        for page_id in missing:
+            self.forget_relation_page(page_id)
+        if missing:
+            print(f"Forgot {len(missing)} missing relation pages")
+        return missing
+
+    def forget_relation_page(self, page_id):
+        normalized = page_id.replace("-", "")
+        self.relation_cache.invalidate_page(page_id)
+        for key in [key for key, value in self.relation_ids.items() if value.replace("-", "") == normalized]:
+            del self.relation_ids[key]
+        for index in self.relation_index.values():
+            for name in [name for name, value in index.items() if value.replace("-", "") == normalized]:
+                del index[name]
+        for titles in self.relation_titles.values():
+            titles.pop(normalized, None)
+        self.calendar.forget(page_id)
+
+    def close(self):
+        self.writer.close()
+        if self.owns_relation_cache:
+            self.relation_cache.close()
+
     def update_page(self, page_id, properties):
-        return self.client.pages.update(page_id=page_id, properties=properties)
+        return self.request(self.client.pages.update, page_id=page_id, properties=properties)
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def create_page(self, parent, properties, icon):
-        return self.client.pages.create(parent=parent, properties=properties, icon=icon)
+        return self.request(self.client.pages.create, parent=parent, properties=properties, icon=icon)
+
+    def submit_update_page(self, page_id, properties, label=None, on_done=None):
+        if self.plan:
+            return self.plan.add_update(label or page_id, properties)
+        return self.writer.submit(
+            "update",
+            label or page_id,
+            self.client.pages.update,
+            on_done=on_done,
+            page_id=page_id,
+            properties=properties,
+        )
+
+    def submit_create_page(self, parent, properties, icon, label=None, on_done=None, recover=None):
+        if self.plan:
+            return self.plan.add_create(label)
+        return self.writer.submit(
+            "create",
+            label,
+            self.client.pages.create,
+            on_done=on_done,
+            recover=recover,
+            parent=parent,
+            properties=properties,
+            icon=icon,
+        )
+
+    def wait_writes(self):
+        return self.writer.wait()
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def query(self, **kwargs):
         kwargs = {k: v for k, v in kwargs.items() if v}
-        return self.client.databases.query(**kwargs)
+        return self.request(self.client.databases.query, **kwargs)
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
-    def query_all(self, database_id):
-        results = []
+    def find_page(self, database_id, filter):
+        results = self.query(database_id=database_id, filter=filter).get("results")
+        return results[0] if results else None
+
+    def iter_all(self, database_id, filter=None, filter_properties=None):
         has_more = True
         start_cursor = None
-        
+
         while has_more:
-            response = self.client.databases.query(
+            kwargs = {"filter": filter, "filter_properties": filter_properties}
+            response = self.request(
+                self.client.databases.query,
                 database_id=database_id,
                 start_cursor=start_cursor,
                 page_size=100,
+                **{k: v for k, v in kwargs.items() if v},
             )
             start_cursor = response.get("next_cursor")
             has_more = response.get("has_more")
-            results.extend(response.get("results"))
-        
+            yield response.get("results")
+
+    def query_all(self, database_id, filter=None, filter_properties=None):
+        results = []
+        for batch in self.iter_all(database_id, filter=filter, filter_properties=filter_properties):
+            results.extend(batch)
         return results
 
+    @metrics.traced("prepare_dates")
+    def prepare_dates(self, dates):
+        self.calendar.prepare(dates)
+
     def get_date_relation(self, properties, date):
-        properties["年"] = get_relation([self.get_year_relation_id(date)])
-        properties["月"] = get_relation([self.get_month_relation_id(date)])
-        properties["周"] = get_relation([self.get_week_relation_id(date)])
-        properties["日"] = get_relation([self.get_day_relation_id(date)])
+        properties.update(self.calendar.get_relations(date))
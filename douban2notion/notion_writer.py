@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import httpx
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from douban2notion.metrics import current_endpoint, get_endpoint_name, metrics
+from douban2notion.ratelimit import backoff_delay
+
+RETRYABLE_STATUS = {409, 429, 500, 502, 503, 504}
+
+
+def get_retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, RequestTimeoutError):
+        return True
+    if isinstance(error, HTTPResponseError):
+        return error.status in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+def is_ambiguous(error):
+    # 超时和连接中断时不知道 Notion 是否已经执行了这次请求
+    return isinstance(error, (RequestTimeoutError, httpx.TransportError))
+
+
+def get_relation_ids(properties):
+    return [
+        relation["id"]
+        for value in (properties or {}).values()
+        if isinstance(value, dict)
+        for relation in value.get("relation") or []
+    ]
+
+
+def is_throttled(error):
+    return isinstance(error, HTTPResponseError) and error.status == 429
+
+
+def call_with_backoff(limiter, max_attempts, fn, recover=None, **kwargs):
+    name = f"notion {get_endpoint_name(fn)}"
+    token = current_endpoint.set(name)
+    attempt = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            limiter.acquire()
+            metrics.record_throttle_wait(name, time.perf_counter() - start)
+            start = time.perf_counter()
+            try:
+                result = fn(**kwargs)
+            except Exception as e:
+                metrics.record_call(name, time.perf_counter() - start, ok=False)
+                attempt += 1
+                if attempt >= max_attempts or not is_retryable(e):
+                    raise
+                metrics.record_retry(name, throttled=is_throttled(e))
+                time.sleep(backoff_delay(attempt, get_retry_after(e)))
+                if recover and is_ambiguous(e):
+                    # 创建页面不是幂等的，请求可能已经生效，重试前先按唯一键查找，找到就当作成功
+                    found = recover()
+                    if found:
+                        return found, attempt
+            else:
+                metrics.record_call(name, time.perf_counter() - start)
+                return result, attempt
+    finally:
+        current_endpoint.reset(token)
+
+
+class WriteExecutor:
+    def __init__(self, limiter, workers=None, max_attempts=None):
+        self.limiter = limiter
+        self.workers = workers or int(os.getenv("NOTION_WRITE_WORKERS", 3))
+        self.max_attempts = max_attempts or int(os.getenv("NOTION_MAX_ATTEMPTS", 8))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # 限制排队中的写入数量，提交方在写入跟不上时阻塞
+        self.slots = threading.BoundedSemaphore(self.workers * 4)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.outcomes = []
+
+    def submit(self, op, label, fn, on_done=None, recover=None, **kwargs):
+        self.slots.acquire()
+        future = self.executor.submit(self._run, op, label, fn, kwargs, on_done, recover)
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+    def _run(self, op, label, fn, kwargs, on_done=None, recover=None):
+        outcome = {"op": op, "label": label, "ok": False, "attempts": 1, "error": None}
+        start = time.monotonic()
+        try:
+            result, retries = call_with_backoff(self.limiter, self.max_attempts, fn, recover=recover, **kwargs)
+            outcome["ok"] = True
+            outcome["attempts"] = retries + 1
+            outcome["page_id"] = result.get("id")
+            # 在 future 完成之前回调，wait() 返回时所有成功写入的回调都已执行完
+            if on_done:
+                on_done(result)
+            return result
+        except Exception as e:
+            outcome["error"] = str(e)
+            outcome["code"] = getattr(e, "code", None)
+            outcome["page_id"] = kwargs.get("page_id")
+            # 记下这次写入引用的关联页面，调用方据此排查被删除或归档的关联页面
+            outcome["relations"] = get_relation_ids(kwargs.get("properties"))
+            print(f"Failed to {op} {label}: {e}")
+            return None
+        finally:
+            outcome["elapsed"] = round(time.monotonic() - start, 3)
+            with self.lock:
+                self.outcomes.append(outcome)
+
+    def wait(self):
+        with self.lock:
+            futures, self.futures = self.futures, []
+        wait(futures)
+        with self.lock:
+            outcomes, self.outcomes = self.outcomes, []
+        failed = [outcome for outcome in outcomes if not outcome["ok"]]
+        retried = sum(outcome["attempts"] - 1 for outcome in outcomes)
+        if outcomes:
+            print(f"Notion writes: {len(outcomes) - len(failed)} ok, {len(failed)} failed, {retried} retries")
+        return outcomes
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,59 @@
+import os
+import threading
+
+from douban2notion.metrics import metrics
+
+PLACEHOLDER_PREFIX = "planned:"
+
+
+def is_placeholder(page_id):
+    return bool(page_id) and page_id.startswith(PLACEHOLDER_PREFIX)
+
+
+# --plan 模式下收集本应执行的 Notion 写入，不真正发出请求
+class SyncPlan:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.creates = []
+        self.updates = []
+        self.relations = []
+
+    def add_create(self, label):
+        with self.lock:
+            self.creates.append(label)
+
+    def add_update(self, label, properties):
+        with self.lock:
+            self.updates.append((label, sorted(properties)))
+
+    def add_relation(self, database_name, title):
+        # 需要新建的关联页面用占位 id 代替，后续引用同一名字时由 get_relation_id 的内存缓存复用
+        with self.lock:
+            self.relations.append((database_name, title))
+        return f"{PLACEHOLDER_PREFIX}{database_name}:{title}"
+
+    def read_calls(self):
+        return sum(
+            stats["calls"]
+            for name, stats in metrics.report()["endpoints"].items()
+            if name.startswith("notion ")
+        )
+
+    def print_summary(self):
+        for label in self.creates:
+            print(f"[plan] 创建 {label}")
+        for label, fields in self.updates:
+            print(f"[plan] 更新 {label}: {', '.join(fields)}")
+        for database_name, title in self.relations:
+            print(f"[plan] 新建关联 {database_name}/{title}")
+
+        writes = len(self.creates) + len(self.updates) + len(self.relations)
+        reads = self.read_calls()
+        budget = reads + writes
+        print(
+            f"Plan: {len(self.creates)} creates, {len(self.updates)} updates, "
+            f"{len(self.relations)} relation pages"
+        )
+        rate = float(os.getenv("NOTION_RATE_LIMIT", 3))
+        estimate = f", at least {budget / rate:.0f}s at {rate:g} req/s" if rate > 0 else ""
+        print(f"Estimated Notion API calls: {budget} ({reads} reads, {writes} writes){estimate}")
@@ -0,0 +1,48 @@
+import random
+import threading
+import time
+
+_host_limiters = {}
+_host_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        # 取到令牌返回 0，否则返回需要等待的秒数
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        wait = self.take()
+        while wait:
+            time.sleep(wait)
+            wait = self.take()
+
+
+def get_host_limiter(host, rate):
+    with _host_lock:
+        if host not in _host_limiters:
+            _host_limiters[host] = TokenBucket(rate)
+        return _host_limiters[host]
+
+
+def backoff_delay(attempt, retry_after=None, base=1.0, cap=60.0):
+    # 服务端给出 Retry-After 时以其为准，否则指数退避；两种情况都加入抖动避免并发请求同时重试
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,77 @@
+import sys
+
+
+def intern_value(value):
+    # 状态、评分、分类 id 等取值只有少数几种，驻留后所有记录共用同一个字符串对象
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def intern_ids(relations):
+    return tuple(
+        intern_value(relation.get("id") if isinstance(relation, dict) else relation)
+        for relation in relations or ()
+    )
+
+
+class ExistingMovie:
+    # Notion 中已有电影的紧凑记录，只保留对比和写入需要的字段；
+    # get/[] 按中文字段名访问，diff_movie 等按字典写的代码可以直接使用
+    __slots__ = ("page_id", "comment", "status", "date", "rating", "categories")
+
+    fields = {
+        "page_id": "page_id",
+        "短评": "comment",
+        "状态": "status",
+        "日期": "date",
+        "评分": "rating",
+        "分类": "categories",
+    }
+
+    def __init__(self, page_id, comment=None, status=None, date=None, rating=None, categories=()):
+        self.page_id = page_id
+        self.comment = comment
+        self.status = intern_value(status)
+        self.date = date
+        self.rating = intern_value(rating)
+        self.categories = intern_ids(categories)
+
+    def __getitem__(self, key):
+        return getattr(self, self.fields[key])
+
+    def get(self, key, default=None):
+        attribute = self.fields.get(key)
+        value = getattr(self, attribute) if attribute else None
+        return default if value is None else value
+
+    def replace(self, **changes):
+        values = {attribute: getattr(self, attribute) for attribute in self.__slots__}
+        values.update((self.fields[key], value) for key, value in changes.items())
+        return ExistingMovie(**values)
+
+
+class DoubanMovie:
+    # 从豆瓣 interest 中提取的字段，原始响应（图片、演员详情等）解析后即可丢弃
+    __slots__ = ("title", "date", "url", "status", "rating", "comment", "genres", "cover", "type", "actors", "directors")
+
+    def __init__(self, title, date, url, status, rating, comment, genres=(), cover=None, type=None, actors=(), directors=()):
+        self.title = title
+        self.date = date
+        self.url = url
+        self.status = intern_value(status)
+        self.rating = intern_value(rating)
+        self.comment = comment
+        self.genres = tuple(intern_value(genre) for genre in genres)
+        self.cover = cover
+        self.type = intern_value(type)
+        self.actors = tuple(actors)
+        self.directors = tuple(directors)
+
+    def to_movie_data(self):
+        return {
+            "电影名": self.title,
+            "日期": self.date,
+            "豆瓣链接": self.url,
+            "状态": self.status,
+            "评分": self.rating,
+            "短评": self.comment,
+        }
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+import time
+
+from douban2notion.state import get_state_path
+
+RELATION_CACHE_FILE = "relation_cache.sqlite"
+
+
+class RelationCache:
+    def __init__(self, path=None, max_entries=None, validate_after=None):
+        self.path = path or get_state_path(RELATION_CACHE_FILE)
+        self.max_entries = max_entries or int(os.getenv("RELATION_CACHE_SIZE", 20000))
+        if validate_after is None:
+            validate_after = int(os.getenv("RELATION_CACHE_TTL", 7 * 24 * 3600))
+        self.validate_after = validate_after
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS relation ("
+            "database_id TEXT NOT NULL, title TEXT NOT NULL, page_id TEXT NOT NULL, "
+            "validated_at REAL NOT NULL, used_at REAL NOT NULL, "
+            "PRIMARY KEY (database_id, title))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS relation_used_at ON relation (used_at)")
+        self.conn.commit()
+
+    def get(self, database_id, title):
+        # 返回 (page_id, 是否需要校验)；超过 validate_after 的条目由调用方向 Notion 确认后再使用
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page_id, validated_at FROM relation WHERE database_id = ? AND title = ?",
+                (database_id, title),
+            ).fetchone()
+            if not row:
+                return None
+            self.conn.execute(
+                "UPDATE relation SET used_at = ? WHERE database_id = ? AND title = ?",
+                (now, database_id, title),
+            )
+        page_id, validated_at = row
+        return page_id, now - validated_at > self.validate_after
+
+    def put(self, database_id, title, page_id):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO relation (database_id, title, page_id, validated_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (database_id, title, page_id, now, now),
+            )
+            self.conn.commit()
+
+    def titles(self, database_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT title, page_id FROM relation WHERE database_id = ?", (database_id,)
+            ).fetchall()
+        return {page_id.replace("-", ""): title for title, page_id in rows}
+
+    def invalidate(self, database_id, title):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM relation WHERE database_id = ? AND title = ?", (database_id, title)
+            )
+            self.conn.commit()
+
+    def invalidate_page(self, page_id):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM relation WHERE replace(page_id, '-', '') = ?", (page_id.replace("-", ""),)
+            )
+            self.conn.commit()
+
+    def evict(self):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM relation WHERE rowid IN ("
+                "SELECT rowid FROM relation ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.evict()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,42 @@
+import json
+import os
+import threading
+
+DEFAULT_STATE_DIR = ".douban2notion"
+
+_state_lock = threading.RLock()
+
+
+def get_state_path(name):
+    state_dir = os.getenv("STATE_DIR", DEFAULT_STATE_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, name)
+
+
+def load_state(name, default=None):
+    path = get_state_path(name)
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        print(f"Ignoring unreadable state file {path}")
+        return default
+
+
+def save_state(name, data):
+    path = get_state_path(name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def update_state(name, update, default=None):
+    # 读取、修改、写回在同一把锁内完成，多个同步任务在同一进程中并发运行时不会互相覆盖
+    with _state_lock:
+        data = load_state(name, default)
+        update(data)
+        save_state(name, data)
+        return data
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from douban2notion.metrics import metrics
+from douban2notion.ratelimit import backoff_delay
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+AUTH_FAILURE_STATUS = {401, 403}
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+HTTP_MAX_ATTEMPTS = int(os.getenv("HTTP_MAX_ATTEMPTS", 5))
+HTTP_TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)), float(os.getenv("HTTP_READ_TIMEOUT", 30)))
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # 连续出现 threshold 次认证失败后熔断，之后的请求直接失败，不再消耗配额
+    def __init__(self, name, threshold=3):
+        self.name = name
+        self.threshold = threshold
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    @property
+    def open(self):
+        return self.failures >= self.threshold
+
+    def check(self):
+        if self.open:
+            raise CircuitOpenError(
+                f"{self.name} returned {self.failures} consecutive auth failures, check the credentials"
+            )
+
+    def record(self, status):
+        with self.lock:
+            if status in AUTH_FAILURE_STATUS:
+                self.failures += 1
+            else:
+                self.failures = 0
+
+
+def get_retry_after(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class Transport:
+    def __init__(self, pool_size=HTTP_POOL_SIZE, max_attempts=HTTP_MAX_ATTEMPTS, timeout=HTTP_TIMEOUT):
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, url, endpoint, limiter=None, breaker=None, **kwargs):
+        # 429/5xx 和网络错误按指数退避加抖动重试，优先使用 Retry-After；最后一次的响应原样返回给调用方判断
+        # data 可以是返回请求体的函数，每次重试时重新生成，用于只能读取一次的流式请求体
+        kwargs.setdefault("timeout", self.timeout)
+        data = kwargs.pop("data", None)
+        attempt = 0
+        while True:
+            if breaker:
+                breaker.check()
+            if limiter:
+                start = time.perf_counter()
+                limiter.acquire()
+                metrics.record_throttle_wait(endpoint, time.perf_counter() - start)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, data=data() if callable(data) else data, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.record_call(endpoint, time.perf_counter() - start, ok=False)
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                metrics.record_retry(endpoint)
+                time.sleep(backoff_delay(attempt))
+                continue
+
+            metrics.record_call(endpoint, time.perf_counter() - start, ok=response.ok)
+            body = response.request.body
+            metrics.record_bytes(
+                endpoint,
+                sent=len(body) if hasattr(body, "__len__") else 0,
+                received=self.get_size(response, kwargs.get("stream")),
+            )
+            if breaker:
+                breaker.record(response.status_code)
+            attempt += 1
+            if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_attempts:
+                return response
+            metrics.record_retry(endpoint, throttled=response.status_code == 429)
+            response.close()
+            time.sleep(backoff_delay(attempt, get_retry_after(response)))
+
+    @staticmethod
+    def get_size(response, stream=False):
+        if stream:
+            return int(response.headers.get("Content-Length") or 0)
+        return len(response.content)
+
+    def get(self, url, endpoint, **kwargs):
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url, endpoint, **kwargs):
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def get_transport():
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
@@ -1,28 +1,50 @@
+import argparse
 import os
 import shutil
-import time
+import threading
+from douban2notion.heatmap import (
+    count_watched_days,
+    get_changed_days,
+    get_embedded_filename,
+    get_heatmap_filename,
+    load_heatmap_counts,
+    prune_heatmaps,
+    record_published,
+    render_heatmap,
+    save_heatmap_counts,
+)
 from douban2notion.notion_helper import NotionHelper
 
 
-def move_and_rename_file():
+TARGET_DIR = os.path.join("./OUT_FOLDER", "movie")
+# 渲染使用固定的中间文件名，多账号并发运行时需要串行
+heatmap_lock = threading.Lock()
+
+
+def move_and_rename_file(current_filename=None):
     source_path = os.path.join("./OUT_FOLDER", "notion.svg")
-    target_dir = os.path.join("./OUT_FOLDER", "movie")
-    os.makedirs(target_dir, exist_ok=True)
+    os.makedirs(TARGET_DIR, exist_ok=True)
 
-    timestamp = int(time.time())
-    new_filename = f"{timestamp}.svg"
-    target_path = os.path.join(target_dir, new_filename)
+    new_filename = get_heatmap_filename(source_path)
+    if new_filename == current_filename:
+        # 与 Notion 中正在引用的热力图内容相同，不移动也不产生新文件
+        os.remove(source_path)
+        return None
+    target_path = os.path.join(TARGET_DIR, new_filename)
 
     shutil.move(source_path, target_path)
     return new_filename  # 返回文件名以便用于生成 URL
 
 
-def main():
-    notion_helper = NotionHelper()
-    new_filename = move_and_rename_file()
+def publish_heatmap(notion_helper):
+    repository = os.getenv("REPOSITORY")
+    if not repository:
+        print("REPOSITORY is not set, leaving the heatmap in OUT_FOLDER/notion.svg")
+        return
+    current_filename = get_embedded_filename(notion_helper.heatmap_url)
+    new_filename = move_and_rename_file(current_filename)
 
     if new_filename:
-        repository = os.getenv("REPOSITORY")
         username, repo_name = repository.split("/")
         
         # 生成 GitHub Pages URL
@@ -33,9 +55,47 @@ def main():
             response = notion_helper.update_heatmap(
                 block_id=notion_helper.heatmap_block_id, url=heatmap_url
             )
+            notion_helper.heatmap_url = heatmap_url
+            notion_helper.save_discovery()
             print(f"Heatmap updated successfully: {response}")
         else:
             print("Heatmap block ID not found in Notion.")
+        current_filename = new_filename
+    else:
+        print("Heatmap content unchanged, skipping Notion update")
+
+    prune_heatmaps(TARGET_DIR, record_published(notion_helper.movie_database_id, current_filename))
+
+
+def refresh_heatmap(notion_helper, movie_dict, synced=None, publish=True):
+    # 同步结束后直接用内存中的电影数据统计热力图，只有统计结果变化时才重新渲染和发布
+    counts = count_watched_days(movie_dict, synced)
+    changed = get_changed_days(notion_helper.movie_database_id, counts)
+    if not changed:
+        print("Heatmap counts unchanged, skipping render")
+        return
+    print(f"Heatmap counts changed on {len(changed)} days")
+    if not publish:
+        # Notion 中嵌入的是 GitHub Pages 上的文件，没有提交和推送这一步时发布出去的链接会指向不存在的文件；
+        # 只保存统计，之后可以用 heatmap 命令渲染并自行推送
+        save_heatmap_counts(notion_helper.movie_database_id, counts)
+        print("Heatmap publishing skipped, run `douban2notion heatmap` and push OUT_FOLDER to publish it")
+        return
+    with heatmap_lock:
+        render_heatmap(counts)
+        publish_heatmap(notion_helper)
+    save_heatmap_counts(notion_helper.movie_database_id, counts)
+
+
+def main(argv=None):
+    # 单独运行时使用上次同步保存的统计重新渲染，数据库 id 和热力图块来自缓存的发现结果
+    argparse.ArgumentParser(description="用上次同步保存的统计重新渲染并发布热力图").parse_args(argv)
+    notion_helper = NotionHelper()
+    try:
+        render_heatmap(load_heatmap_counts(notion_helper.movie_database_id))
+        publish_heatmap(notion_helper)
+    finally:
+        notion_helper.close()
 
 
 if __name__ == "__main__":
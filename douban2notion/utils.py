@@ -1,10 +1,10 @@
 import calendar
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 import hashlib
 import os
 import re
-import requests
-import base64
+import shutil
 from douban2notion.config import (
     RICH_TEXT,
     URL,
@@ -17,7 +17,6 @@ from douban2notion.config import (
     SELECT,
     MULTI_SELECT
 )
-import pendulum
 
 MAX_LENGTH = 1024  # NOTION 2000个字符限制 https://developers.notion.com/reference/request-limits
 
@@ -64,6 +63,9 @@ def get_icon(url):
 def get_select(name):
     return {"select": {"name": name}}
 
+def get_status(name):
+    return {"status": {"name": name}}
+
 def get_number(number):
     return {"number": number}
 
@@ -104,33 +106,125 @@ def get_first_and_last_day_of_week(date):
     last_day = first_day + timedelta(days=6)
     return first_day, last_day
 
+def get_year_bucket(date):
+    start, end = get_first_and_last_day_of_year(date)
+    return date.strftime("%Y"), {"日期": get_date(format_date(start), format_date(end))}
+
+def get_month_bucket(date):
+    start, end = get_first_and_last_day_of_month(date)
+    return date.strftime("%Y年%-m月"), {"日期": get_date(format_date(start), format_date(end))}
+
+def get_week_bucket(date):
+    year, week, _ = date.isocalendar()
+    start, end = get_first_and_last_day_of_week(date)
+    return f"{year}年第{week}周", {"日期": get_date(format_date(start), format_date(end))}
+
+def get_day_bucket(date):
+    day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day.strftime("%Y年%m月%d日"), {"日期": get_date(format_date(date))}
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    # 优先使用标准库的 zoneinfo，热力图等只处理日期的入口不必导入 pendulum
+    try:
+        from zoneinfo import ZoneInfo
+
+        return ZoneInfo(name)
+    except (ImportError, KeyError):
+        import pendulum
+
+        return pendulum.timezone(name)
+
+def get_local_date(timestamp):
+    # 日历关联和热力图都按这个时区划分日期，北京时间 0 点到 8 点标记的电影不会被算到前一天
+    return datetime.fromtimestamp(timestamp, get_timezone(tz))
+
+def encode_date(value):
+    # 整数时间戳没有微秒，isoformat 的前 19 位就是 Notion 需要的 "YYYY-MM-DD HH:MM:SS"
+    return get_date(get_local_date(value).isoformat(" ")[:19])
+
+def decode_date(content):
+    date_str = content.get("start")
+    if not date_str:
+        return 0
+    try:
+        date = datetime.fromisoformat(date_str)
+    except ValueError:
+        # fromisoformat 不认识的格式（例如旧版本 Python 上的 "Z" 后缀）交给 pendulum
+        import pendulum
+
+        return int(pendulum.parse(date_str).timestamp())
+    if date.tzinfo is None:
+        # 与 pendulum.parse 一致，不带时区的日期按 UTC 处理
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
+
+def decode_text(content):
+    return content[0].get("plain_text")
+
+def decode_name(content):
+    return content.get("name")
+
+def decode_file(content):
+    return content[0].get("external", {}).get("url")
+
+def decode_raw(content):
+    return content
+
+property_encoders = {
+    TITLE: get_title,
+    RICH_TEXT: get_rich_text,
+    NUMBER: get_number,
+    STATUS: get_status,
+    FILES: get_file,
+    DATE: encode_date,
+    URL: get_url,
+    SELECT: get_select,
+    MULTI_SELECT: get_multi_select,
+    RELATION: get_relation,
+}
+
+property_decoders = {
+    TITLE: decode_text,
+    RICH_TEXT: decode_text,
+    STATUS: decode_name,
+    SELECT: decode_name,
+    FILES: decode_file,
+    DATE: decode_date,
+}
+
+class PropertyCodec:
+    # 按属性类型表预先为每个字段选好编码和解码函数，逐条处理时只剩一次字典查找
+    def __init__(self, type_map):
+        self.encoders = {key: property_encoders[prop_type] for key, prop_type in type_map.items() if prop_type in property_encoders}
+        self.decoders = {key: (prop_type, property_decoders.get(prop_type, decode_raw)) for key, prop_type in type_map.items()}
+
+    def encode(self, data):
+        encoders = self.encoders
+        return {key: encoders[key](value) for key, value in data.items() if value is not None and key in encoders}
+
+    def decode(self, properties, key):
+        prop = properties.get(key)
+        if prop is None:
+            return None
+        prop_type, decoder = self.decoders[key]
+        content = prop.get(prop_type)
+        if content is None and prop.get("type") != prop_type:
+            # Notion 中的属性类型被改过时退回按返回的类型解码
+            return get_property_value(prop)
+        return decoder(content) if content else None
+
+_codecs = {}
+
+def get_codec(type_map):
+    key = tuple(type_map.items())
+    codec = _codecs.get(key)
+    if codec is None:
+        codec = _codecs[key] = PropertyCodec(type_map)
+    return codec
+
 def get_properties(data, type_map):
-    properties = {}
-    for key, value in data.items():
-        if value is None:
-            continue
-        prop_type = type_map.get(key)
-        if prop_type == TITLE:
-            properties[key] = get_title(value)
-        elif prop_type == RICH_TEXT:
-            properties[key] = get_rich_text(value)
-        elif prop_type == NUMBER:
-            properties[key] = get_number(value)
-        elif prop_type == STATUS:
-            properties[key] = {"status": {"name": value}}
-        elif prop_type == FILES:
-            properties[key] = get_file(value)
-        elif prop_type == DATE:
-            properties[key] = get_date(pendulum.from_timestamp(value, tz=tz).to_datetime_string())
-        elif prop_type == URL:
-            properties[key] = get_url(value)
-        elif prop_type == SELECT:
-            properties[key] = get_select(value)
-        elif prop_type == MULTI_SELECT:
-            properties[key] = get_multi_select(value)
-        elif prop_type == RELATION:
-            properties[key] = get_relation(value)
-    return properties
+    return get_codec(type_map).encode(data)
 
 def get_property_value(prop):
     if prop is None:
@@ -139,26 +233,15 @@ def get_property_value(prop):
     content = prop.get(prop_type)
     if not content:
         return None
-    if prop_type in ["title", "rich_text"]:
-        return content[0].get("plain_text") if content else None
-    if prop_type in ["status", "select"]:
-        return content.get("name")
-    if prop_type == "files" and content:
-        return content[0].get("external", {}).get("url")
-    if prop_type == "date":
-        return str_to_timestamp(content.get("start"))
-    return content
+    return property_decoders.get(prop_type, decode_raw)(content)
 
 def str_to_timestamp(date_str):
-    if not date_str:
-        return 0
-    return int(pendulum.parse(date_str).timestamp())
+    return decode_date({"start": date_str})
 
 def upload_image(folder_path, filename, file_path):
-    with open(file_path, 'rb') as file:
-        content_base64 = base64.b64encode(file.read()).decode('utf-8')
-    data = {'file': content_base64, 'filename': filename, 'folder': folder_path}
-    response = requests.post('https://wereadassets.malinkang.com/', json=data)
+    from douban2notion.cover_cache import upload_file
+
+    response = upload_file(file_path, filename, folder_path)
     if response.status_code == 200:
         print('File uploaded successfully.')
         return response.text
@@ -169,25 +252,29 @@ def url_to_md5(url):
     return hashlib.md5(url.encode('utf-8')).hexdigest()
 
 def download_image(url, save_dir="cover"):
+    # 每次都经过封面缓存，过期时按 ETag/Last-Modified 重新验证；save_dir/<md5>.jpg 是指向缓存文件的硬链接，
+    # 内容只保存一份。与原来一样，下载失败时也返回这个路径
+    from douban2notion.cover_cache import get_cover_cache
+
     os.makedirs(save_dir, exist_ok=True)
-    file_name = f"{url_to_md5(url)}.jpg"
-    save_path = os.path.join(save_dir, file_name)
-    if os.path.exists(save_path):
-        print(f"File {file_name} already exists. Skipping download.")
-        return save_path
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        with open(save_path, "wb") as file:
-            for chunk in response.iter_content(chunk_size=128):
-                file.write(chunk)
-        print(f"Image downloaded successfully to {save_path}")
-    else:
-        print(f"Failed to download image. Status code: {response.status_code}")
+    save_path = os.path.join(save_dir, f"{url_to_md5(url)}.jpg")
+    cached_path = get_cover_cache().get(url)
+    if cached_path and not (os.path.exists(save_path) and os.path.samefile(cached_path, save_path)):
+        temp_path = f"{save_path}.part"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            os.link(cached_path, temp_path)
+        except OSError:
+            # 缓存目录和 save_dir 不在同一个文件系统时退回复制
+            shutil.copyfile(cached_path, temp_path)
+        os.replace(temp_path, save_path)
     return save_path
 
 def upload_cover(url):
-    cover_file = download_image(url)
-    return upload_image("cover", os.path.basename(cover_file), cover_file)
+    from douban2notion.cover_cache import get_cover_cache
+
+    return get_cover_cache().upload(url, "cover")
 
 def get_embed(url):
     return {"type": "embed", "embed": {"url": url}}
@@ -0,0 +1,106 @@
+import argparse
+import os
+import signal
+import threading
+import time
+import traceback
+
+from douban2notion.douban import sync_movies
+from douban2notion.metrics import write_report
+from douban2notion.notion_helper import NotionHelper
+from douban2notion.transport import CircuitOpenError
+
+WATCH_MIN_INTERVAL = float(os.getenv("WATCH_MIN_INTERVAL", 15))
+WATCH_MAX_INTERVAL = float(os.getenv("WATCH_MAX_INTERVAL", 60))
+WATCH_BACKOFF = float(os.getenv("WATCH_BACKOFF", 1.5))
+
+
+class AdaptiveInterval:
+    # 有写入后回到最短间隔，空闲时按倍数放宽到最长间隔；出错时直接退到最长间隔，避免反复撞上同一个故障
+    def __init__(self, minimum=WATCH_MIN_INTERVAL, maximum=WATCH_MAX_INTERVAL, factor=WATCH_BACKOFF):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.factor = max(factor, 1)
+        self.current = minimum
+
+    def next(self, active):
+        if active:
+            self.current = self.minimum
+        else:
+            self.current = min(self.current * self.factor, self.maximum)
+        return self.current
+
+    def fail(self):
+        self.current = self.maximum
+        return self.current
+
+
+class Watcher:
+    def __init__(self, douban_name, notion_helper, interval=None):
+        self.douban_name = douban_name
+        self.notion_helper = notion_helper
+        self.interval = interval or AdaptiveInterval()
+        self.stopping = threading.Event()
+
+    def stop(self, signum=None, frame=None):
+        if self.stopping.is_set():
+            # 第二次信号不再等待本轮结束；未完成的写入由检查点日志在下次启动时继续
+            raise KeyboardInterrupt
+        print("Stopping after the current sync round")
+        self.stopping.set()
+
+    def run_once(self):
+        start = time.monotonic()
+        try:
+            # 常驻进程不会提交和推送 OUT_FOLDER，不发布热力图
+            results = sync_movies(self.douban_name, self.notion_helper, publish_heatmap=False)
+        except CircuitOpenError:
+            # 熔断在进程内不会自动恢复，凭据失效时继续轮询没有意义，交给调用方退出
+            raise
+        except Exception:
+            print(f"Sync round failed:\n{traceback.format_exc()}")
+            return self.interval.fail()
+        active = bool(results and (results["created"] or results["updated"]))
+        delay = self.interval.next(active)
+        print(f"Sync round took {time.monotonic() - start:.1f}s, next poll in {delay:.0f}s")
+        return delay
+
+    def run(self):
+        # 常驻进程复用同一个 NotionHelper，数据库发现结果、关联缓存和连接池在各轮之间保持；
+        # 增量水位使每轮只需请求各状态的第一页豆瓣数据
+        while not self.stopping.is_set():
+            self.stopping.wait(self.run_once())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常驻运行，定期把豆瓣的新标记同步到 Notion")
+    parser.add_argument("--preload", action="store_true", help="启动时预加载分类、导演和日期数据库")
+    parser.add_argument("--min-interval", type=float, default=WATCH_MIN_INTERVAL, help="有变化后的轮询间隔（秒）")
+    parser.add_argument("--max-interval", type=float, default=WATCH_MAX_INTERVAL, help="空闲时的最长轮询间隔（秒）")
+    options = parser.parse_args(argv)
+
+    douban_name = os.getenv("DOUBAN_NAME")
+    if not douban_name:
+        raise SystemExit("Error: 请设置 DOUBAN_NAME 环境变量")
+
+    notion_helper = NotionHelper(preload=options.preload)
+    watcher = Watcher(
+        douban_name,
+        notion_helper,
+        AdaptiveInterval(options.min_interval, options.max_interval),
+    )
+    signal.signal(signal.SIGTERM, watcher.stop)
+    signal.signal(signal.SIGINT, watcher.stop)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("Interrupted, the next start will resume from the checkpoint journal")
+    except CircuitOpenError as e:
+        raise SystemExit(f"Error: {e}, stopping the watcher")
+    finally:
+        notion_helper.close()
+        write_report()
+
+
+if __name__ == "__main__":
+    main()
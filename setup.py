@@ -1,20 +1,23 @@
 from setuptools import setup, find_packages
 
 setup(
+    name="douban2notion",
     version="0.0.7",
     packages=find_packages(),
     install_requires=[
         "requests",
         "pendulum",
-        "retrying",
         "notion-client",
         "github-heatmap",
         "python-dotenv",
     ],
     entry_points={
         "console_scripts": [
-            "douban = douban2notion.douban:main",
-            "heatmap = douban2notion.update_heatmap:main",
+            "douban2notion = douban2notion.cli:main",
+            "douban = douban2notion.cli:douban",
+            "heatmap = douban2notion.cli:heatmap",
+            "douban-multi = douban2notion.cli:multi",
+            "douban-watch = douban2notion.cli:watch",
         ],
     },
     author="Harry",
@@ -28,5 +31,5 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.9",
 )
@@ -0,0 +1,133 @@
+"""检查点日志的端到端测试：在本地模拟的豆瓣和 Notion 服务上中断一次同步，再运行一次完成它。
+
+    python -m pytest tests
+"""
+import os
+import subprocess
+import sys
+import threading
+from collections import Counter
+
+import pytest
+
+from benchmarks.fake_services import FakeDouban, FakeNotion, make_interests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZE = 400
+INTERRUPT_AT = 250
+
+
+class RecordingDouban(FakeDouban):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.starts = []
+
+    def route(self, method, path, query, body):
+        self.starts.append((query.get("status", [""])[0], int(query.get("start", ["0"])[0])))
+        return super().route(method, path, query, body)
+
+
+class InterruptingNotion(FakeNotion):
+    # 第 limit 次创建电影时先写入页面再挂起，相当于进程在 create 返回之后、记录完成之前被杀；
+    # 之后的创建请求全部挂起，直到测试杀掉同步进程
+    def __init__(self, limit, hide_unconfirmed=False, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self.hide_unconfirmed = hide_unconfirmed
+        self.movie_creates = 0
+        self.unconfirmed_url = None
+        self.interrupted = threading.Event()
+        self.released = threading.Event()
+
+    def route(self, method, path, query, body):
+        if (
+            method == "POST"
+            and path.rstrip("/").endswith("/pages")
+            and body["parent"]["database_id"] == self.database_id("电影")
+            and not self.released.is_set()
+        ):
+            with self.lock:
+                self.movie_creates += 1
+                count = self.movie_creates
+            if count >= self.limit:
+                if count == self.limit:
+                    _, _, page = super().route(method, path, query, body)
+                    self.unconfirmed_url = body["properties"]["豆瓣链接"]["url"]
+                    if self.hide_unconfirmed:
+                        # 让增量刷新镜像时查不到这个页面，只能靠按豆瓣链接确认未完成的创建
+                        page["last_edited_time"] = "2000-01-01T00:00:00.000Z"
+                self.interrupted.set()
+                self.released.wait()
+                return "notion pages.create", 503, {"object": "error", "status": 503,
+                                                    "code": "service_unavailable", "message": "stopped"}
+        return super().route(method, path, query, body)
+
+    def movie_urls(self):
+        with self.lock:
+            pages = [self.pages[page_id] for page_id in self.databases[self.database_id("电影")]["pages"]]
+        return Counter(page["properties"]["豆瓣链接"]["url"] for page in pages)
+
+
+def get_env(douban, notion, state_dir):
+    return {
+        "PATH": os.environ["PATH"],
+        "PYTHONPATH": ROOT,
+        "NOTION_TOKEN": "fake",
+        "NOTION_MOVIE_URL": notion.page_url,
+        "NOTION_BASE_URL": notion.url,
+        "DOUBAN_NAME": "resume",
+        "DOUBAN_API_URL": douban.url,
+        "STATE_DIR": state_dir,
+        "NOTION_RATE_LIMIT": "0",
+        "DOUBAN_RATE_LIMIT": "0",
+    }
+
+
+def list_journals(state_dir):
+    return [name for name in os.listdir(state_dir) if name.startswith("journal_")]
+
+
+@pytest.mark.parametrize("hide_unconfirmed", [False, True])
+def test_interrupted_sync_resumes_without_duplicates(tmp_path, hide_unconfirmed):
+    interests = make_interests(SIZE)
+    douban = RecordingDouban(interests=interests).start()
+    notion = InterruptingNotion(INTERRUPT_AT, hide_unconfirmed).start()
+    state_dir = str(tmp_path)
+    env = get_env(douban, notion, state_dir)
+    command = [sys.executable, "-m", "douban2notion", "sync", "movie"]
+    try:
+        process = subprocess.Popen(
+            command, env=env, cwd=state_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            assert notion.interrupted.wait(120), "the first run never reached the interruption point"
+        finally:
+            process.kill()
+            process.wait()
+        notion.released.set()
+
+        assert list_journals(state_dir)
+        created_before = sum(notion.movie_urls().values())
+        douban.starts.clear()
+
+        result = subprocess.run(command, env=env, cwd=state_dir, capture_output=True, text=True, timeout=300)
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert "Resuming the interrupted sync" in result.stdout
+        urls = notion.movie_urls()
+        assert len(urls) == SIZE
+        assert max(urls.values()) == 1
+        assert created_before < SIZE
+        # 被中断的那次创建已经写入 Notion，只是没有记录完成，恢复时不会再创建一次
+        assert notion.unconfirmed_url and urls[notion.unconfirmed_url] == 1
+        if hide_unconfirmed:
+            assert "Found movie created by the interrupted run" in result.stdout
+
+        # 已完成的豆瓣页面不会重新抓取，已写入的电影直接跳过
+        assert min(start for status, start in douban.starts if status == "done") > 0
+        assert "written before the interruption" in result.stdout
+
+        assert list_journals(state_dir) == []
+    finally:
+        notion.released.set()
+        douban.stop()
+        notion.stop()